@@ -3,42 +3,74 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
+from collections import deque
+from dataclasses import replace
+from datetime import datetime, timedelta, tzinfo
 from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
 from .cache import MuniTimesCache
 from .const import (
+    ADAPTIVE_POLL_MAX_INTERVAL,
+    ADAPTIVE_POLL_SLACK,
+    ADAPTIVE_POLL_TIERS,
+    BULK_FETCH_MIN_STOPS,
+    CACHE_MIN_TTL,
     CONF_AGENCY,
     CONF_API_KEY,
     CONF_CACHE_DURATION,
     CONF_CACHE_ENABLED,
     CONF_CACHE_MAX_SIZE,
+    CONF_MAX_RESULTS,
     CONF_REQUEST_TIMEOUT,
     CONF_RETRY_DELAY,
     CONF_RETRY_MAX_ATTEMPTS,
+    CONF_SHOW_LINE_ICONS,
     CONF_STOPS,
+    CONF_TIME_FORMAT,
+    CONF_TIME_ZONE,
     CONF_UPDATE_INTERVAL,
     DEFAULT_AGENCY,
     DEFAULT_CACHE_DURATION,
     DEFAULT_CACHE_ENABLED,
     DEFAULT_CACHE_MAX_SIZE,
+    DEFAULT_MAX_RESULTS,
     DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_RESPONSE_CACHE_TTL,
     DEFAULT_RETRY_DELAY,
     DEFAULT_RETRY_MAX_ATTEMPTS,
+    DEFAULT_SHOW_LINE_ICONS,
+    DEFAULT_TIME_FORMAT,
+    DEFAULT_TIME_ZONE,
     DEFAULT_UPDATE_INTERVAL,
+    DIAGNOSTICS_CACHE_TTL,
     DOMAIN,
+    EVENT_CACHE_INVALIDATED,
+    FETCH_DEADLINE_RATIO,
+    MAX_CONCURRENT_REQUESTS,
     SERVICE_CLEAR_CACHE,
     SERVICE_GET_DIAGNOSTICS,
     SERVICE_REFRESH_DATA,
     SERVICE_RESET_ERROR_COUNT,
     SERVICE_TEST_CONNECTION,
+    TIME_FORMAT_FULL,
+    TIME_FORMAT_VERBOSE,
 )
-from .exceptions import MuniAPIError, MuniCacheError
+from .exceptions import (
+    MuniAPIError,
+    MuniAuthenticationError,
+    MuniCacheError,
+    MuniRateLimitError,
+    MuniTimeoutError,
+)
+from .models import StopData
 from .muni_api import MuniAPI
 
 _LOGGER = logging.getLogger(__name__)
@@ -65,13 +97,15 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     retry_delay = entry.data.get(CONF_RETRY_DELAY, DEFAULT_RETRY_DELAY)
     request_timeout = entry.data.get(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT)
     
-    # Initialize API client with configuration
+    # Initialize API client with configuration, sharing Home Assistant's session
     api = MuniAPI(
         api_key=api_key,
         agency=agency,
+        session=async_get_clientsession(hass),
         max_retries=max_retries,
         retry_delay=retry_delay,
         request_timeout=request_timeout,
+        response_cache_ttl=DEFAULT_RESPONSE_CACHE_TTL if cache_enabled else 0,
     )
     
     # Initialize cache if enabled
@@ -83,10 +117,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                 cache_duration_minutes=cache_duration,
                 max_cache_size_mb=cache_max_size,
             )
+            await cache.async_load()
             _LOGGER.info("Cache enabled with %d minute duration", cache_duration)
         except Exception as e:
             _LOGGER.warning("Failed to initialize cache: %s", e)
     
+    # Resolve the display time zone without blocking the event loop
+    time_zone_name = entry.data.get(CONF_TIME_ZONE, DEFAULT_TIME_ZONE)
+    time_zone = await dt_util.async_get_time_zone(time_zone_name)
+    if time_zone is None:
+        _LOGGER.warning("Unknown time zone %s, using UTC", time_zone_name)
+        time_zone = dt_util.UTC
+    
     # Initialize coordinator
     coordinator = MuniTimesDataUpdateCoordinator(
         hass,
@@ -95,6 +137,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         cache=cache,
         update_interval=timedelta(seconds=update_interval),
         entry=entry,
+        time_zone=time_zone,
     )
 
     try:
@@ -142,114 +185,184 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
         cache: MuniTimesCache | None,
         update_interval: timedelta,
         entry: ConfigEntry,
+        time_zone: tzinfo = dt_util.UTC,
     ) -> None:
         """Initialize with enhanced error handling and caching."""
         self.api = api
-        self.stops = stops
         self.cache = cache
         self.entry = entry
         
         # Error tracking
         self.consecutive_failures = 0
         self.last_successful_update = None
-        self.error_history: list[str] = []
         self.max_error_history = 10
+        self.error_history: deque[str] = deque(maxlen=self.max_error_history)
         
         # Cache statistics
         self.cache_hits = 0
         self.cache_misses = 0
         
+        # Predictions last written to the persistent cache, per stop
+        self._cached_signatures: dict[str, tuple] = {}
+        
+        # Last diagnostics snapshot as (monotonic time, data)
+        self._diagnostics_cache: tuple[float, dict[str, Any]] | None = None
+        
+        # API health and cache status captured once per update for sensors
+        self.health_snapshot: dict[str, Any] | None = None
+        self.cache_snapshot: dict[str, Any] | None = None
+        
+        # Limit concurrent requests so large stop lists don't flood 511.org
+        self._request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        # Display options applied when building sensor payloads
+        self._max_results = entry.data.get(CONF_MAX_RESULTS, DEFAULT_MAX_RESULTS)
+        self._show_line_icons = entry.data.get(CONF_SHOW_LINE_ICONS, DEFAULT_SHOW_LINE_ICONS)
+        self._time_format = entry.data.get(CONF_TIME_FORMAT, DEFAULT_TIME_FORMAT)
+        self._time_zone = time_zone
+        
+        # Monotonic time at which each stop is next due for a fetch
+        self._next_fetch: dict[str, float] = {}
+        
+        # Configured stops, indexed by stop code
+        self.stops: list[dict] = []
+        self._stops_by_code: dict[str, dict] = {}
+        self.update_stops(stops)
+        
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
             update_interval=update_interval,
+            always_update=False,
         )
 
-    async def _async_update_data(self) -> dict[str, Any]:
+    async def _async_update_data(self) -> dict[str, StopData]:
         """Update data via API with caching fallback."""
         data = {}
+        carried_forward = {}
         api_errors = []
-        cache_used = False
+        cache_hits = 0
+        cache_misses = 0
         
-        for stop in self.stops:
-            stop_code = stop.get("stop_code")
-            if not stop_code:
+        now = time.monotonic()
+        updated_at = dt_util.utcnow()
+        previous_data = self.data or {}
+        
+        # Only fetch stops that are due; others keep their previous arrivals
+        stops = []
+        for stop_code, stop in self._stops_by_code.items():
+            previous = previous_data.get(stop_code)
+            next_fetch = self._next_fetch.get(stop_code)
+            if previous is not None and next_fetch is not None and next_fetch - now > ADAPTIVE_POLL_SLACK:
+                data[stop_code] = self._reuse_if_unchanged(previous, replace(
+                    previous, arrivals=self.api.refresh_arrival_times(previous.arrivals)
+                ))
                 continue
             
-            try:
-                # Try to fetch fresh data from API
-                stop_data = await self.api.get_arrivals(stop_code)
+            stops.append(stop)
+        
+        # Fetch all due stops at once; failures are returned per stop
+        results = await self._fetch_all_arrivals([stop["stop_code"] for stop in stops])
+        
+        for stop, result in zip(stops, results):
+            stop_code = stop["stop_code"]
+            
+            if not isinstance(result, Exception):
+                stop_data = result
                 
-                # Cache the successful result
-                if self.cache:
+                # Cache the successful result unless its predictions are unchanged
+                # and the persisted entry hasn't since expired or been evicted
+                signature = self._prediction_signature(stop_data)
+                if self.cache and (
+                    self._cached_signatures.get(stop_code) != signature
+                    or not await self.cache.has_cached_data(stop_code)
+                ):
                     try:
                         await self.cache.cache_data(stop_code, {
                             "arrivals": stop_data,
                             "config": stop
-                        })
+                        }, self._cache_ttl_for(stop_data))
+                        self._cached_signatures[stop_code] = signature
                     except MuniCacheError as e:
                         _LOGGER.warning("Failed to cache data for stop %s: %s", stop_code, e)
                 
-                data[stop_code] = {
-                    "arrivals": stop_data,
-                    "config": stop,
-                    "from_cache": False,
-                    "last_updated": datetime.now(),
-                }
+                data[stop_code] = self._reuse_if_unchanged(previous_data.get(stop_code), StopData(
+                    arrivals=stop_data,
+                    config=stop,
+                    last_updated=updated_at,
+                ))
+                self._next_fetch[stop_code] = now + self._poll_interval_for(stop_data)
                 
                 _LOGGER.debug("Fresh data retrieved for stop %s", stop_code)
-                
-            except MuniAPIError as e:
-                api_errors.append(f"Stop {stop_code}: {e}")
-                
-                # Try to use cached data as fallback
-                if self.cache:
-                    try:
-                        cached_data = await self.cache.get_cached_data(stop_code)
-                        if cached_data:
-                            data[stop_code] = {
-                                "arrivals": cached_data.get("arrivals", []),
-                                "config": cached_data.get("config", stop),
-                                "from_cache": True,
-                                "cached_at": cached_data.get("cached_at"),
-                                "cache_age_minutes": cached_data.get("cache_age_minutes", 0),
-                            }
-                            cache_used = True
-                            self.cache_hits += 1
-                            
-                            _LOGGER.info(
-                                "Using cached data for stop %s (age: %.1f minutes)",
-                                stop_code, cached_data.get("cache_age_minutes", 0)
-                            )
-                        else:
-                            self.cache_misses += 1
-                            _LOGGER.warning("No cached data available for stop %s", stop_code)
-                    except MuniCacheError as cache_error:
-                        _LOGGER.error("Cache error for stop %s: %s", stop_code, cache_error)
-                        self.cache_misses += 1
-                else:
-                    _LOGGER.warning("No cache available for stop %s during API failure", stop_code)
+                continue
+            
+            self._next_fetch.pop(stop_code, None)
+            api_errors.append(f"Stop {stop_code}: {result}")
+            
+            # Try to use cached data as fallback
+            if self.cache:
+                try:
+                    cached_data = await self.cache.get_cached_data(stop_code)
+                    if cached_data:
+                        data[stop_code] = StopData(
+                            arrivals=self.api.refresh_arrival_times(cached_data.get("arrivals", [])),
+                            config=cached_data.get("config", stop),
+                            from_cache=True,
+                            cached_at=cached_data.get("cached_at"),
+                            cache_age_minutes=cached_data.get("cache_age_minutes", 0),
+                        )
+                        cache_hits += 1
+                        
+                        _LOGGER.info(
+                            "Using cached data for stop %s (age: %.1f minutes)",
+                            stop_code, cached_data.get("cache_age_minutes", 0)
+                        )
+                    else:
+                        cache_misses += 1
+                        _LOGGER.warning("No cached data available for stop %s", stop_code)
+                except MuniCacheError as cache_error:
+                    _LOGGER.error("Cache error for stop %s: %s", stop_code, cache_error)
+                    cache_misses += 1
+            else:
+                _LOGGER.warning("No cache available for stop %s during API failure", stop_code)
+            
+            # Keep showing the last known arrivals rather than dropping the stop
+            if stop_code not in data and stop_code in previous_data:
+                carried_forward[stop_code] = self._carry_forward(previous_data[stop_code])
+                _LOGGER.info("Keeping previous data for stop %s after API failure", stop_code)
+        
+        self.cache_hits += cache_hits
+        self.cache_misses += cache_misses
         
         # Handle the case where we have some data (fresh or cached)
         if data:
+            data.update(carried_forward)
+            
+            # Pre-format sensor payloads for entries that changed this update
+            for stop_code, entry in data.items():
+                if entry is not previous_data.get(stop_code):
+                    entry.lines = self._build_sensor_lines(entry.arrivals)
+            
+            # Any data (fresh or cached) counts as a successful update
+            self.consecutive_failures = 0
+            
             if api_errors:
-                if cache_used:
+                if cache_hits:
                     # We have some cached data, so this is a partial success
                     _LOGGER.warning(
                         "API errors for some stops, using cached data: %s",
                         "; ".join(api_errors)
                     )
-                    self.consecutive_failures = 0  # Reset because we have data
                 else:
                     # We have fresh data for some stops but errors for others
                     _LOGGER.warning("Partial API failure: %s", "; ".join(api_errors))
-                    self.consecutive_failures = 0  # Reset because we have some fresh data
-            else:
-                # Complete success
-                self.consecutive_failures = 0
-                self.last_successful_update = datetime.now()
+            elif stops:
+                # Complete success; ticks where no stop was due fetched nothing
+                self.last_successful_update = updated_at
             
+            self._diagnostics_cache = None
+            self._refresh_snapshots()
             return data
         
         # No data at all - complete failure
@@ -258,40 +371,274 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
         
         # Track error history
         self.error_history.append(error_message)
-        if len(self.error_history) > self.max_error_history:
-            self.error_history.pop(0)
         
         _LOGGER.error("Complete update failure (consecutive failures: %d): %s", 
                      self.consecutive_failures, error_message)
         
+        self._diagnostics_cache = None
+        self._refresh_snapshots()
         raise UpdateFailed(error_message)
 
+    def _refresh_snapshots(self) -> None:
+        """Capture API health and cache status so sensors don't recompute them on every state read."""
+        try:
+            self.health_snapshot = self.api.get_health_status()
+        except Exception as e:
+            _LOGGER.debug("Failed to get API health status: %s", e)
+            self.health_snapshot = None
+        
+        if self.cache:
+            try:
+                self.cache_snapshot = self.cache.get_cache_info()
+            except Exception as e:
+                _LOGGER.debug("Failed to get cache info: %s", e)
+                self.cache_snapshot = {"error": str(e)}
+
+    def update_stops(self, stops: list[dict]) -> None:
+        """Replace the configured stops and rebuild the stop-code index.
+
+        Stops without a stop code are dropped here once, so nothing else
+        needs to check for them.
+        """
+        self.stops = [stop for stop in stops if stop.get("stop_code")]
+        self._stops_by_code = {stop["stop_code"]: stop for stop in self.stops}
+        
+        # Forget poll schedules for stops that are no longer configured
+        for stop_code in list(self._next_fetch):
+            if stop_code not in self._stops_by_code:
+                del self._next_fetch[stop_code]
+
+    @staticmethod
+    def _reuse_if_unchanged(previous: StopData | None, entry: StopData) -> StopData:
+        """Return the previous entry if its arrivals and data source are unchanged.
+
+        Keeping the previous object (including its last_updated timestamp)
+        lets the coordinator's always_update=False equality check skip
+        listener callbacks and state writes when predictions didn't change.
+        """
+        if (
+            previous is not None
+            and previous.from_cache == entry.from_cache
+            and previous.arrivals == entry.arrivals
+        ):
+            return previous
+        return entry
+
+    def _carry_forward(self, previous: StopData) -> StopData:
+        """Turn a stop's previous entry into a stale entry after a failed fetch."""
+        arrivals = self.api.refresh_arrival_times(previous.arrivals)
+        now = dt_util.utcnow()
+        
+        # Already stale: keep its original time but let the age keep growing
+        if previous.from_cache:
+            cached_at = dt_util.parse_datetime(previous.cached_at) if previous.cached_at else None
+            return replace(
+                previous,
+                arrivals=arrivals,
+                cache_age_minutes=(
+                    (now - cached_at).total_seconds() / 60
+                    if cached_at else previous.cache_age_minutes
+                ),
+            )
+        
+        last_updated = previous.last_updated
+        return replace(
+            previous,
+            arrivals=arrivals,
+            from_cache=True,
+            cached_at=last_updated.isoformat() if last_updated else None,
+            cache_age_minutes=(
+                (now - last_updated).total_seconds() / 60
+                if last_updated else 0
+            ),
+        )
+
+    def _build_sensor_lines(self, arrivals: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Build the per-line payload sensors expose, formatted for display.
+
+        Runs once per changed stop, so sensors only hand out the prebuilt lists.
+        """
+        max_results = self._max_results
+        format_time = self._format_time
+        line_key = "line" if self._show_line_icons else "line_ref"
+        
+        lines = []
+        for arrival in arrivals[:max_results]:
+            get = arrival.get
+            line_ref = get("line_ref", "")
+            lines.append({
+                "line": get(line_key, ""),
+                "line_ref": line_ref,
+                "destinations": get("destinations", []),
+                "arrivals": [
+                    {
+                        "minutes": "?" if (minutes := time_info.get("minutes")) is None else str(minutes),
+                        "formatted_time": format_time(time_info),
+                        "destination": time_info.get("destination", ""),
+                        "arrival_time": time_info.get("arrival_time", ""),
+                    }
+                    for time_info in get("times", [])[:max_results]
+                ],
+            })
+        return lines
+
+    def _format_time(self, time_info: dict[str, Any]) -> str:
+        """Format an arrival according to the configured time format."""
+        minutes = time_info.get("minutes")
+        
+        if self._time_format == TIME_FORMAT_VERBOSE and minutes is not None:
+            return f"{minutes} minute" if minutes == 1 else f"{minutes} minutes"
+        
+        if self._time_format == TIME_FORMAT_FULL and time_info.get("arrival_time"):
+            try:
+                arrival_time = datetime.fromisoformat(time_info["arrival_time"])
+                local_time = arrival_time.astimezone(self._time_zone)
+                return f"{minutes} min ({local_time:%H:%M})"
+            except ValueError:
+                pass
+        
+        return time_info.get("formatted_time", "?")
+
+    def _poll_interval_for(self, arrivals: list[dict[str, Any]]) -> float:
+        """Return how long a stop can go without a fetch given its next arrival.
+
+        Stops with an imminent arrival refresh every update, while stops whose
+        next vehicle is far away (or that have no arrivals) poll less often.
+        The configured update interval is always the lower bound.
+        """
+        base_interval = self.update_interval.total_seconds()
+        interval = ADAPTIVE_POLL_MAX_INTERVAL
+        
+        try:
+            next_due = arrivals[0]["times"][0]["minutes"] * 60
+        except (IndexError, KeyError, TypeError):
+            next_due = None
+        
+        if next_due is not None:
+            for threshold, tier_interval in ADAPTIVE_POLL_TIERS:
+                if next_due < threshold:
+                    interval = tier_interval
+                    break
+        
+        return max(interval, base_interval)
+
+    @staticmethod
+    def _prediction_signature(arrivals: list[dict[str, Any]]) -> tuple:
+        """Return the predictions of a stop without the time-dependent countdowns."""
+        return tuple(
+            (time_info.get("arrival_time"), arrival.get("line_ref"), time_info.get("destination"))
+            for arrival in arrivals
+            for time_info in arrival.get("times", [])
+        )
+
+    @staticmethod
+    def _cache_ttl_for(arrivals: list[dict[str, Any]]) -> timedelta | None:
+        """Return how long a stop's arrivals stay useful as a fallback.
+
+        Cached predictions are worthless once the last predicted vehicle has
+        arrived, so the TTL runs until then (never below CACHE_MIN_TTL).
+        Stops without predictions use the configured cache duration.
+        """
+        latest = None
+        for arrival in arrivals:
+            for time_info in arrival.get("times", []):
+                try:
+                    arrival_time = datetime.fromisoformat(time_info["arrival_time"])
+                except (KeyError, AttributeError, ValueError):
+                    continue
+                if latest is None or arrival_time > latest:
+                    latest = arrival_time
+        
+        if latest is None:
+            return None
+        
+        return max(latest - dt_util.utcnow(), timedelta(seconds=CACHE_MIN_TTL))
+
+    async def _fetch_all_arrivals(
+        self, stop_codes: list[str]
+    ) -> list[list[dict[str, Any]] | BaseException]:
+        """Fetch arrivals for all stops, preferring a single bulk request.
+
+        The bulk request and any per-stop fallback share one deadline, so a
+        slow or retried fetch can't overlap the next refresh.
+        """
+        deadline = self.update_interval.total_seconds() * FETCH_DEADLINE_RATIO
+        deadline_at = asyncio.get_running_loop().time() + deadline
+        
+        if len(stop_codes) >= BULK_FETCH_MIN_STOPS:
+            try:
+                async with asyncio.timeout_at(deadline_at):
+                    bulk = await self.api.get_arrivals_bulk(stop_codes)
+            except (MuniAuthenticationError, MuniRateLimitError) as e:
+                # The API is refusing us; per-stop requests would only add load
+                _LOGGER.warning("Bulk arrivals request rejected: %s", e)
+                return [e] * len(stop_codes)
+            except MuniAPIError as e:
+                _LOGGER.warning(
+                    "Bulk arrivals request failed, falling back to per-stop requests: %s", e
+                )
+            except TimeoutError:
+                # No time left for per-stop requests; stops fall back to cached data
+                _LOGGER.warning(
+                    "Bulk arrivals request exceeded the %.0fs refresh deadline", deadline
+                )
+                return [
+                    MuniTimeoutError(f"Fetching stop {stop_code} exceeded the refresh deadline")
+                    for stop_code in stop_codes
+                ]
+            else:
+                return [bulk.get(stop_code, []) for stop_code in stop_codes]
+        
+        # Per-stop requests get whatever remains of the deadline
+        tasks: dict[str, asyncio.Task] = {}
+        try:
+            async with asyncio.timeout_at(deadline_at), asyncio.TaskGroup() as tg:
+                for stop_code in stop_codes:
+                    tasks[stop_code] = tg.create_task(self._fetch_stop_arrivals(stop_code))
+        except TimeoutError:
+            _LOGGER.warning(
+                "Arrival fetches exceeded the %.0fs refresh deadline, cancelled the rest",
+                deadline,
+            )
+        
+        return [
+            tasks[stop_code].result()
+            if tasks[stop_code].done() and not tasks[stop_code].cancelled()
+            else MuniTimeoutError(f"Fetching stop {stop_code} exceeded the refresh deadline")
+            for stop_code in stop_codes
+        ]
+
+    async def _fetch_stop_arrivals(
+        self, stop_code: str
+    ) -> list[dict[str, Any]] | Exception:
+        """Fetch arrivals for one stop, bounded by the request semaphore.
+
+        Errors are returned rather than raised so one failing stop doesn't
+        cancel its siblings in the task group.
+        """
+        try:
+            async with self._request_semaphore:
+                return await self.api.get_arrivals(stop_code)
+        except Exception as e:
+            return e
+
     async def _has_any_cached_data(self) -> bool:
         """Check if we have cached data for any stops."""
         if not self.cache:
             return False
         
-        for stop in self.stops:
-            stop_code = stop.get("stop_code")
-            if stop_code and await self.cache.has_cached_data(stop_code):
-                return True
-        
-        return False
+        return await self.cache.has_any_cached_data(self._stops_by_code)
 
     async def async_refresh_data(self, stop_code: str | None = None) -> None:
         """Manually refresh data for all stops or a specific stop."""
         if stop_code:
             _LOGGER.info("Manual refresh requested for stop %s", stop_code)
-            # Find the stop configuration
-            stop_config = None
-            for stop in self.stops:
-                if stop.get("stop_code") == stop_code:
-                    stop_config = stop
-                    break
-            
+            stop_config = self._stops_by_code.get(stop_code)
             if not stop_config:
                 raise ValueError(f"Stop {stop_code} not found in configuration")
             
+            self._invalidate([stop_code], "manual_refresh")
+            
             # Refresh just this stop
             try:
                 stop_data = await self.api.get_arrivals(stop_code)
@@ -300,19 +647,20 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
                 if self.data is None:
                     self.data = {}
                 
-                self.data[stop_code] = {
-                    "arrivals": stop_data,
-                    "config": stop_config,
-                    "from_cache": False,
-                    "last_updated": datetime.now(),
-                }
+                self.data[stop_code] = StopData(
+                    arrivals=stop_data,
+                    config=stop_config,
+                    last_updated=dt_util.utcnow(),
+                    lines=self._build_sensor_lines(stop_data),
+                )
                 
                 # Cache the result
                 if self.cache:
                     await self.cache.cache_data(stop_code, {
                         "arrivals": stop_data,
                         "config": stop_config
-                    })
+                    }, self._cache_ttl_for(stop_data))
+                    self._cached_signatures[stop_code] = self._prediction_signature(stop_data)
                 
                 _LOGGER.info("Successfully refreshed data for stop %s", stop_code)
                 
@@ -321,28 +669,81 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
                 raise
         else:
             _LOGGER.info("Manual refresh requested for all stops")
+            self._invalidate(None, "manual_refresh")
+            # Make every stop due regardless of its adaptive poll interval
+            self._next_fetch.clear()
             await self.async_request_refresh()
 
-    async def async_clear_cache(self, stop_code: str | None = None) -> None:
-        """Clear cache for all stops or a specific stop."""
+    async def async_clear_cache(
+        self, stop_code: str | None = None, line: str | None = None
+    ) -> None:
+        """Clear cache for all stops, a specific stop, or every stop serving a line."""
+        if line:
+            stop_codes = self._stops_serving_line(line)
+            if not stop_codes:
+                _LOGGER.warning("No configured stop currently serves line %s", line)
+                return
+        elif stop_code:
+            stop_codes = [stop_code]
+        else:
+            stop_codes = None
+        
+        self._invalidate(stop_codes, "cache_cleared")
+        
+        # Make the next successful fetch rewrite the cleared entries
+        if stop_codes is None:
+            self._cached_signatures.clear()
+        else:
+            for code in stop_codes:
+                self._cached_signatures.pop(code, None)
+        
         if not self.cache:
             _LOGGER.warning("Cache is not enabled")
             return
         
         try:
-            await self.cache.clear_cache(stop_code)
-            if stop_code:
-                _LOGGER.info("Cache cleared for stop %s", stop_code)
-            else:
+            if stop_codes is None:
+                await self.cache.clear_cache()
                 _LOGGER.info("All cache cleared")
+            else:
+                for code in stop_codes:
+                    await self.cache.clear_cache(code)
+                _LOGGER.info("Cache cleared for stops: %s", ", ".join(stop_codes))
         except MuniCacheError as e:
             _LOGGER.error("Failed to clear cache: %s", e)
             raise
 
+    def _invalidate(self, stop_codes: list[str] | None, reason: str) -> None:
+        """Drop short-lived API responses for stops and announce the invalidation.
+
+        Fires a muni_times_cache_invalidated event so automations can react
+        without polling. None means every configured stop.
+        """
+        if stop_codes is None:
+            self.api.invalidate()
+        else:
+            for stop_code in stop_codes:
+                self.api.invalidate(stop_code)
+        
+        self.hass.bus.async_fire(EVENT_CACHE_INVALIDATED, {
+            "entry_id": self.entry.entry_id,
+            "stop_codes": list(self._stops_by_code) if stop_codes is None else stop_codes,
+            "reason": reason,
+        })
+
+    def _stops_serving_line(self, line_ref: str) -> list[str]:
+        """Return the stops whose latest arrivals include a line."""
+        line_ref = line_ref.upper()
+        return [
+            stop_code
+            for stop_code, entry in (self.data or {}).items()
+            if any(arrival.get("line_ref") == line_ref for arrival in entry.arrivals)
+        ]
+
     async def async_test_connection(self, test_stop_code: str | None = None) -> bool:
         """Test the API connection."""
-        if test_stop_code is None and self.stops:
-            test_stop_code = self.stops[0].get("stop_code")
+        if test_stop_code is None:
+            test_stop_code = next(iter(self._stops_by_code), None)
         
         if not test_stop_code:
             _LOGGER.error("No stop code available for connection test")
@@ -355,10 +756,18 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
         self.consecutive_failures = 0
         self.error_history.clear()
         self.api.reset_health_monitoring()
+        self._diagnostics_cache = None
+        self._refresh_snapshots()
         _LOGGER.info("Error counters and health monitoring reset")
 
     def get_diagnostics_data(self) -> dict[str, Any]:
-        """Get diagnostic data for troubleshooting."""
+        """Get diagnostic data for troubleshooting, reusing a recent snapshot."""
+        if (
+            self._diagnostics_cache is not None
+            and time.monotonic() - self._diagnostics_cache[0] < DIAGNOSTICS_CACHE_TTL
+        ):
+            return self._diagnostics_cache[1]
+        
         api_health = self.api.get_health_status()
         
         diagnostics = {
@@ -368,7 +777,7 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
                     self.last_successful_update.isoformat()
                     if self.last_successful_update else None
                 ),
-                "error_history": self.error_history.copy(),
+                "error_history": list(self.error_history),
                 "cache_hits": self.cache_hits,
                 "cache_misses": self.cache_misses,
                 "stops_configured": len(self.stops),
@@ -377,6 +786,7 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
             "cache_info": self.cache.get_cache_info() if self.cache else None,
         }
         
+        self._diagnostics_cache = (time.monotonic(), diagnostics)
         return diagnostics
 
     async def async_cleanup(self) -> None:
@@ -395,52 +805,58 @@ class MuniTimesDataUpdateCoordinator(DataUpdateCoordinator):
             _LOGGER.warning("Error during coordinator cleanup: %s", e)
 
 
+def _get_coordinators(hass: HomeAssistant) -> list[MuniTimesDataUpdateCoordinator]:
+    """Return the coordinators of all loaded entries."""
+    return list(hass.data.get(DOMAIN, {}).values())
+
+
+def _log_failures(results: list[Any], message: str) -> None:
+    """Log the exceptions returned by a gather over coordinators."""
+    for result in results:
+        if isinstance(result, Exception):
+            _LOGGER.error("%s: %s", message, result)
+
+
 async def _async_register_services(hass: HomeAssistant) -> None:
-    """Register services for the integration."""
+    """Register services for the integration (once, shared by all entries)."""
+    if hass.services.has_service(DOMAIN, SERVICE_REFRESH_DATA):
+        return
     
     async def refresh_data_service(call: ServiceCall) -> None:
         """Handle refresh data service call."""
         stop_code = call.data.get("stop_code")
         
-        # Find the coordinator for the service call
-        # If no specific entry is provided, refresh all
-        coordinators = []
-        for entry_id, coordinator in hass.data[DOMAIN].items():
-            coordinators.append(coordinator)
-        
+        coordinators = _get_coordinators(hass)
         if not coordinators:
             _LOGGER.error("No coordinators available for refresh")
             return
         
-        # Refresh data for all coordinators
-        for coordinator in coordinators:
-            try:
-                await coordinator.async_refresh_data(stop_code)
-            except Exception as e:
-                _LOGGER.error("Failed to refresh data: %s", e)
+        # Refresh data for all coordinators concurrently
+        results = await asyncio.gather(
+            *(coordinator.async_refresh_data(stop_code) for coordinator in coordinators),
+            return_exceptions=True,
+        )
+        _log_failures(results, "Failed to refresh data")
 
     async def clear_cache_service(call: ServiceCall) -> None:
         """Handle clear cache service call."""
         stop_code = call.data.get("stop_code")
+        line = call.data.get("line")
         
-        coordinators = []
-        for entry_id, coordinator in hass.data[DOMAIN].items():
-            coordinators.append(coordinator)
-        
-        for coordinator in coordinators:
-            try:
-                await coordinator.async_clear_cache(stop_code)
-            except Exception as e:
-                _LOGGER.error("Failed to clear cache: %s", e)
+        results = await asyncio.gather(
+            *(
+                coordinator.async_clear_cache(stop_code, line)
+                for coordinator in _get_coordinators(hass)
+            ),
+            return_exceptions=True,
+        )
+        _log_failures(results, "Failed to clear cache")
 
     async def test_connection_service(call: ServiceCall) -> None:
         """Handle test connection service call."""
         test_stop_code = call.data.get("stop_code")
         
-        coordinators = []
-        for entry_id, coordinator in hass.data[DOMAIN].items():
-            coordinators.append(coordinator)
-        
+        coordinators = _get_coordinators(hass)
         if not coordinators:
             _LOGGER.error("No coordinators available for connection test")
             return
@@ -461,11 +877,7 @@ async def _async_register_services(hass: HomeAssistant) -> None:
         include_cache = call.data.get("include_cache", True)
         include_api_status = call.data.get("include_api_status", True)
         
-        coordinators = []
-        for entry_id, coordinator in hass.data[DOMAIN].items():
-            coordinators.append(coordinator)
-        
-        for coordinator in coordinators:
+        for coordinator in _get_coordinators(hass):
             try:
                 diagnostics = coordinator.get_diagnostics_data()
                 _LOGGER.info("Diagnostics: %s", diagnostics)
@@ -474,11 +886,7 @@ async def _async_register_services(hass: HomeAssistant) -> None:
 
     async def reset_error_count_service(call: ServiceCall) -> None:
         """Handle reset error count service call."""
-        coordinators = []
-        for entry_id, coordinator in hass.data[DOMAIN].items():
-            coordinators.append(coordinator)
-        
-        for coordinator in coordinators:
+        for coordinator in _get_coordinators(hass):
             try:
                 coordinator.reset_error_count()
             except Exception as e:
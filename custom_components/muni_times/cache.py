@@ -2,17 +2,22 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 import os
+import tempfile
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
+from urllib.parse import quote, unquote
 
 from homeassistant.core import HomeAssistant
 from homeassistant.util import dt as dt_util
 
+from .const import CACHE_SAVE_DELAY
 from .exceptions import MuniCacheError
+from .utils import json_dumps, json_loads
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,6 +25,27 @@ _LOGGER = logging.getLogger(__name__)
 class MuniTimesCache:
     """Cache manager for transit data with file persistence."""
     
+    __slots__ = (
+        "hass",
+        "cache_duration",
+        "cache_duration_seconds",
+        "max_cache_size_bytes",
+        "cache_dir",
+        "stops_dir",
+        "legacy_cache_file",
+        "legacy_metadata_file",
+        "_memory_cache",
+        "_cache_timestamps",
+        "_entry_sizes",
+        "_estimated_size",
+        "_lock",
+        "_save_lock",
+        "_save_task",
+        "_dirty_stops",
+        "_deleted_stops",
+        "_remove_legacy_files",
+    )
+    
     def __init__(
         self,
         hass: HomeAssistant,
@@ -30,6 +56,7 @@ class MuniTimesCache:
         """Initialize the cache manager."""
         self.hass = hass
         self.cache_duration = timedelta(minutes=cache_duration_minutes)
+        self.cache_duration_seconds = self.cache_duration.total_seconds()
         self.max_cache_size_bytes = max_cache_size_mb * 1024 * 1024
         
         # Set up cache directory
@@ -38,91 +65,265 @@ class MuniTimesCache:
         else:
             self.cache_dir = Path(hass.config.path("muni_times_cache"))
         
-        self.cache_dir.mkdir(exist_ok=True)
-        self.cache_file = self.cache_dir / "transit_data.json"
-        self.metadata_file = self.cache_dir / "cache_metadata.json"
+        self.stops_dir = self.cache_dir / "stops"
+        self.legacy_cache_file = self.cache_dir / "transit_data.json"
+        self.legacy_metadata_file = self.cache_dir / "cache_metadata.json"
         
-        # In-memory cache for performance
-        self._memory_cache: dict[str, dict[str, Any]] = {}
-        self._cache_timestamps: dict[str, datetime] = {}
+        # In-memory cache for performance, least recently used first
+        self._memory_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._cache_timestamps: dict[str, float] = {}  # monotonic insert times
+        self._entry_sizes: dict[str, int] = {}  # serialized bytes per entry
+        self._estimated_size = 0
         self._lock = asyncio.Lock()
+        self._save_lock = asyncio.Lock()  # serializes disk flushes
+        self._save_task: asyncio.Task | None = None
+        
+        # Stops whose files must be written or removed on the next save
+        self._dirty_stops: set[str] = set()
+        self._deleted_stops: set[str] = set()
         
-        # Load existing cache
-        self._load_cache_from_disk()
+        # Single-file cache left by older versions, removed once migrated
+        self._remove_legacy_files = False
     
-    def _load_cache_from_disk(self) -> None:
-        """Load cache data from disk on startup."""
+    async def async_load(self) -> None:
+        """Create the cache directory and load existing entries without blocking the event loop."""
         try:
-            if self.cache_file.exists():
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                
-                # Load cached data with timestamp validation
-                current_time = dt_util.utcnow()
-                for stop_code, data in cache_data.items():
-                    cached_at_str = data.get("cached_at")
-                    if cached_at_str:
-                        try:
-                            cached_at = datetime.fromisoformat(cached_at_str.replace('Z', '+00:00'))
-                            age = current_time - cached_at
-                            
-                            if age <= self.cache_duration:
-                                self._memory_cache[stop_code] = data
-                                self._cache_timestamps[stop_code] = cached_at
-                            else:
-                                _LOGGER.debug(
-                                    "Discarding expired cache entry for stop %s (age: %s)",
-                                    stop_code, age
-                                )
-                        except ValueError as e:
-                            _LOGGER.warning(
-                                "Invalid timestamp in cache for stop %s: %s",
-                                stop_code, e
-                            )
+            cache_data, migrated, has_legacy = await self.hass.async_add_executor_job(
+                self._read_cache_files
+            )
+            
+            # Migrated entries still need their own stop files
+            self._dirty_stops.update(migrated)
+            self._remove_legacy_files = has_legacy
+            
+            # Load cached data with timestamp validation
+            current_time = time.time()
+            duration_for = self._duration_for
+            for stop_code, data in cache_data.items():
+                try:
+                    cached_at_ts = data.get("cached_at_ts")
+                    if cached_at_ts is None:
+                        # Entries written before the epoch timestamp was stored
+                        cached_at_ts = datetime.fromisoformat(data["cached_at"]).timestamp()
+                    age = current_time - cached_at_ts
+                    
+                    if age <= duration_for(data):
+                        self._store_entry(stop_code, data, time.monotonic() - age)
+                        continue
+                    
+                    _LOGGER.debug(
+                        "Discarding expired cache entry for stop %s (age: %.0fs)",
+                        stop_code, age
+                    )
+                except (KeyError, TypeError, ValueError) as e:
+                    _LOGGER.warning(
+                        "Invalid timestamp in cache for stop %s: %s",
+                        stop_code, e
+                    )
                 
-                _LOGGER.info(
-                    "Loaded %d valid cache entries from disk",
-                    len(self._memory_cache)
-                )
+                # Remove the stale file on the next save
+                self._dirty_stops.discard(stop_code)
+                self._deleted_stops.add(stop_code)
+            
+            _LOGGER.info(
+                "Loaded %d valid cache entries from disk",
+                len(self._memory_cache)
+            )
+            
+            # Write migrated entries (and drop the legacy files) without waiting for new data
+            if self._remove_legacy_files:
+                self._schedule_save()
             
         except Exception as e:
             _LOGGER.warning("Failed to load cache from disk: %s", e)
-            self._memory_cache = {}
-            self._cache_timestamps = {}
+            self._reset_entries()
+    
+    def _read_cache_files(self) -> tuple[dict[str, dict[str, Any]], set[str], bool]:
+        """Read all stop files and migrate the legacy file (runs in the executor).
+
+        Returns the entries by stop code, the stop codes migrated from the
+        single-file layout used by older versions and whether any of its
+        files exist. Those files are kept until the migrated entries have
+        been written as stop files.
+        """
+        self.stops_dir.mkdir(parents=True, exist_ok=True)
+        cache_data = {}
+        migrated = set()
+        
+        if self.legacy_cache_file.exists():
+            cache_data.update(json_loads(self.legacy_cache_file.read_bytes()))
+            migrated.update(cache_data)
+        
+        # Remove temporary files left by writes interrupted by a crash
+        for directory in (self.cache_dir, self.stops_dir):
+            for temp_file in directory.glob("*.tmp"):
+                temp_file.unlink(missing_ok=True)
+        
+        for stop_file in self.stops_dir.glob("*.json"):
+            stop_code = unquote(stop_file.stem)
+            try:
+                cache_data[stop_code] = json_loads(stop_file.read_bytes())
+            except ValueError as e:
+                _LOGGER.warning("Discarding unreadable cache file for stop %s: %s", stop_code, e)
+                stop_file.unlink(missing_ok=True)
+        
+        has_legacy = self.legacy_cache_file.exists() or self.legacy_metadata_file.exists()
+        return cache_data, migrated, has_legacy
     
     async def _save_cache_to_disk(self) -> None:
-        """Save current cache to disk."""
-        try:
-            # Prepare data for serialization
-            cache_data = {}
-            for stop_code, data in self._memory_cache.items():
-                cache_data[stop_code] = data.copy()
-            
-            # Write to temporary file first, then rename (atomic operation)
-            temp_file = self.cache_file.with_suffix('.tmp')
-            
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-            
-            # Atomic rename
-            temp_file.rename(self.cache_file)
-            
-            # Update metadata
-            metadata = {
-                "last_saved": dt_util.utcnow().isoformat(),
-                "entry_count": len(cache_data),
-                "file_size_bytes": self.cache_file.stat().st_size,
+        """Write changed stops to disk without blocking the event loop.
+
+        Flushes run one at a time, so a newer snapshot is never overwritten
+        by an older one still being written.
+        """
+        async with self._save_lock:
+            # Snapshot pending changes on the loop; serialization and file I/O run in the executor.
+            # Entries are replaced, never mutated, so the executor can serialize them by reference.
+            changed = {
+                stop_code: self._memory_cache[stop_code]
+                for stop_code in self._dirty_stops
+                if stop_code in self._memory_cache
             }
+            deleted = set(self._deleted_stops)
+            remove_legacy = self._remove_legacy_files
+            self._dirty_stops.clear()
+            self._deleted_stops.clear()
             
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            try:
+                await self.hass.async_add_executor_job(
+                    self._write_cache_files,
+                    changed,
+                    deleted,
+                    remove_legacy,
+                )
+                if remove_legacy:
+                    self._remove_legacy_files = False
+                
+            except Exception as e:
+                # Retry these stops on the next save
+                self._dirty_stops.update(code for code in changed if code in self._memory_cache)
+                self._deleted_stops.update(deleted)
+                _LOGGER.error("Failed to save cache to disk: %s", e)
+                raise MuniCacheError(f"Failed to save cache: {e}") from e
+    
+    def _schedule_save(self) -> None:
+        """Schedule a debounced save so a burst of writes hits the disk once."""
+        if self._save_task is None or self._save_task.done():
+            self._save_task = self.hass.async_create_background_task(
+                self._delayed_save(), "muni_times cache save"
+            )
+    
+    async def _delayed_save(self) -> None:
+        """Save the cache after the debounce delay.
+
+        Writes that land during a flush find this task still running, so it
+        flushes again until nothing is left to save.
+        """
+        while True:
+            await asyncio.sleep(CACHE_SAVE_DELAY)
+            try:
+                await self._save_cache_to_disk()
+            except MuniCacheError:
+                return  # Already logged; the next write schedules another save
             
-        except Exception as e:
-            _LOGGER.error("Failed to save cache to disk: %s", e)
-            raise MuniCacheError(f"Failed to save cache: {e}") from e
+            if not self._dirty_stops and not self._deleted_stops:
+                return
+    
+    def _stop_file(self, stop_code: str) -> Path:
+        """Return the file holding a stop's cache entry."""
+        return self.stops_dir / f"{quote(stop_code, safe='')}.json"
+    
+    def _write_cache_files(
+        self,
+        changed: dict[str, dict[str, Any]],
+        deleted: set[str],
+        remove_legacy: bool = False,
+    ) -> None:
+        """Write changed stop files and remove deleted ones (runs in the executor).
+
+        With remove_legacy, the migrated single-file cache and its metadata
+        file are removed once the stop files are written.
+        """
+        for stop_code, data in changed.items():
+            self._atomic_write(self._stop_file(stop_code), json_dumps(data))
+        
+        for stop_code in deleted:
+            self._stop_file(stop_code).unlink(missing_ok=True)
+        
+        if remove_legacy:
+            self.legacy_cache_file.unlink(missing_ok=True)
+            self.legacy_metadata_file.unlink(missing_ok=True)
     
-    async def cache_data(self, stop_code: str, data: dict[str, Any]) -> None:
-        """Cache data for a specific stop."""
+    @staticmethod
+    def _atomic_write(path: Path, payload: bytes) -> None:
+        """Durably replace a file: write a uniquely named temporary file, fsync it,
+        os.replace it over the target and fsync the directory.
+        """
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+        ) as f:
+            temp_file = f.name
+            try:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                f.close()
+                os.unlink(temp_file)
+                raise
+        
+        try:
+            os.replace(temp_file, path)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
+        
+        # Persist the rename itself; directories can't be opened on Windows
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    
+    def _store_entry(self, stop_code: str, entry: dict[str, Any], inserted_at: float) -> None:
+        """Store an entry and keep the size estimate in step."""
+        size = len(json_dumps(entry))
+        self._estimated_size += size - self._entry_sizes.get(stop_code, 0)
+        self._memory_cache[stop_code] = entry
+        self._memory_cache.move_to_end(stop_code)
+        self._cache_timestamps[stop_code] = inserted_at
+        self._entry_sizes[stop_code] = size
+    
+    def _drop_entry(self, stop_code: str) -> None:
+        """Remove an entry, keep the size estimate in step and delete its file on the next save."""
+        self._dirty_stops.discard(stop_code)
+        self._deleted_stops.add(stop_code)
+        self._memory_cache.pop(stop_code, None)
+        self._cache_timestamps.pop(stop_code, None)
+        self._estimated_size -= self._entry_sizes.pop(stop_code, 0)
+    
+    def _reset_entries(self) -> None:
+        """Remove all entries."""
+        self._memory_cache.clear()
+        self._cache_timestamps.clear()
+        self._entry_sizes.clear()
+        self._estimated_size = 0
+    
+    def _duration_for(self, entry: dict[str, Any]) -> float:
+        """Return how many seconds a cache entry stays valid."""
+        ttl_seconds = entry.get("ttl_seconds")
+        if ttl_seconds is None:
+            return self.cache_duration_seconds
+        return ttl_seconds
+    
+    async def cache_data(
+        self, stop_code: str, data: dict[str, Any], ttl: timedelta | None = None
+    ) -> None:
+        """Cache data for a specific stop, optionally with its own TTL.
+
+        The TTL is capped at the configured cache duration.
+        """
         if not stop_code or not data:
             return
         
@@ -134,13 +335,17 @@ class MuniTimesCache:
                 cache_entry = {
                     "stop_code": stop_code,
                     "cached_at": current_time.isoformat(),
+                    "cached_at_ts": current_time.timestamp(),
                     "arrivals": data.get("arrivals", []),
                     "config": data.get("config", {}),
                 }
+                if ttl is not None:
+                    cache_entry["ttl_seconds"] = min(ttl.total_seconds(), self.cache_duration_seconds)
                 
                 # Store in memory cache
-                self._memory_cache[stop_code] = cache_entry
-                self._cache_timestamps[stop_code] = current_time
+                self._store_entry(stop_code, cache_entry, time.monotonic())
+                self._dirty_stops.add(stop_code)
+                self._deleted_stops.discard(stop_code)
                 
                 # Clean up expired entries
                 await self._cleanup_expired_entries()
@@ -148,8 +353,8 @@ class MuniTimesCache:
                 # Check cache size and clean up if needed
                 await self._enforce_cache_size_limit()
                 
-                # Save to disk (async to avoid blocking)
-                asyncio.create_task(self._save_cache_to_disk())
+                # Save to disk shortly, coalescing writes for other stops
+                self._schedule_save()
                 
                 _LOGGER.debug("Cached data for stop %s", stop_code)
                 
@@ -158,43 +363,50 @@ class MuniTimesCache:
                 raise MuniCacheError(f"Failed to cache data: {e}") from e
     
     async def get_cached_data(self, stop_code: str) -> dict[str, Any] | None:
-        """Get cached data for a specific stop."""
+        """Get cached data for a specific stop.
+
+        The returned arrivals and config are shared with the cache and must not be mutated.
+        """
         if not stop_code:
             return None
         
-        async with self._lock:
-            try:
-                if stop_code not in self._memory_cache:
-                    return None
-                
-                cached_at = self._cache_timestamps.get(stop_code)
-                if not cached_at:
-                    # Remove invalid entry
-                    self._memory_cache.pop(stop_code, None)
-                    return None
-                
-                # Check if cache is still valid
-                age = dt_util.utcnow() - cached_at
-                if age > self.cache_duration:
-                    # Remove expired entry
-                    self._memory_cache.pop(stop_code, None)
-                    self._cache_timestamps.pop(stop_code, None)
-                    _LOGGER.debug("Cache expired for stop %s (age: %s)", stop_code, age)
-                    return None
-                
-                cached_data = self._memory_cache[stop_code].copy()
-                cached_data["cache_age_minutes"] = age.total_seconds() / 60
-                
+        # Fast path: a valid hit needs no lock since nothing here awaits
+        entry = self._memory_cache.get(stop_code)
+        cached_at = self._cache_timestamps.get(stop_code)
+        if entry is None:
+            return None
+        if cached_at is not None:
+            age = time.monotonic() - cached_at
+            if age <= self._duration_for(entry):
+                self._memory_cache.move_to_end(stop_code)
                 _LOGGER.debug(
                     "Retrieved cached data for stop %s (age: %.1f minutes)",
-                    stop_code, cached_data["cache_age_minutes"]
+                    stop_code, age / 60
                 )
-                
-                return cached_data
+                return {
+                    "arrivals": entry["arrivals"],
+                    "config": entry["config"],
+                    "cached_at": entry["cached_at"],
+                    "cache_age_minutes": age / 60,
+                }
+        
+        # Slow path: remove the invalid or expired entry under the lock
+        async with self._lock:
+            try:
+                replaced = self._memory_cache.get(stop_code) is not entry
+                if not replaced:
+                    self._drop_entry(stop_code)
+                    if cached_at is not None:
+                        _LOGGER.debug("Cache expired for stop %s (age: %.0fs)", stop_code, age)
                 
             except Exception as e:
                 _LOGGER.error("Failed to get cached data for stop %s: %s", stop_code, e)
                 return None
+        
+        # Replaced or cleared while waiting for the lock; look again
+        if replaced:
+            return await self.get_cached_data(stop_code)
+        return None
     
     async def clear_cache(self, stop_code: str | None = None) -> None:
         """Clear cache for a specific stop or all stops."""
@@ -202,13 +414,13 @@ class MuniTimesCache:
             try:
                 if stop_code:
                     # Clear specific stop
-                    self._memory_cache.pop(stop_code, None)
-                    self._cache_timestamps.pop(stop_code, None)
+                    self._drop_entry(stop_code)
                     _LOGGER.info("Cleared cache for stop %s", stop_code)
                 else:
                     # Clear all cache
-                    self._memory_cache.clear()
-                    self._cache_timestamps.clear()
+                    self._deleted_stops.update(self._memory_cache)
+                    self._dirty_stops.clear()
+                    self._reset_entries()
                     _LOGGER.info("Cleared all cache data")
                 
                 # Save updated cache to disk
@@ -220,49 +432,35 @@ class MuniTimesCache:
     
     async def _cleanup_expired_entries(self) -> None:
         """Remove expired entries from cache."""
-        current_time = dt_util.utcnow()
-        expired_stops = []
+        current_time = time.monotonic()
+        get_timestamp = self._cache_timestamps.get
+        duration_for = self._duration_for
         
-        for stop_code, cached_at in self._cache_timestamps.items():
-            age = current_time - cached_at
-            if age > self.cache_duration:
-                expired_stops.append(stop_code)
+        # Collect first so dropping never mutates the dict being iterated
+        expired_stops = [
+            stop_code
+            for stop_code, entry in self._memory_cache.items()
+            if current_time - get_timestamp(stop_code, current_time) > duration_for(entry)
+        ]
+        if not expired_stops:
+            return
         
         for stop_code in expired_stops:
-            self._memory_cache.pop(stop_code, None)
-            self._cache_timestamps.pop(stop_code, None)
+            self._drop_entry(stop_code)
         
-        if expired_stops:
-            _LOGGER.debug("Cleaned up %d expired cache entries", len(expired_stops))
+        _LOGGER.debug("Cleaned up %d expired cache entries", len(expired_stops))
     
     async def _enforce_cache_size_limit(self) -> None:
-        """Enforce cache size limits by removing oldest entries."""
-        # Estimate memory usage (rough calculation)
-        estimated_size = 0
-        for data in self._memory_cache.values():
-            estimated_size += len(json.dumps(data, ensure_ascii=False))
-        
-        if estimated_size > self.max_cache_size_bytes:
-            # Remove oldest entries until under limit
-            sorted_entries = sorted(
-                self._cache_timestamps.items(),
-                key=lambda x: x[1]  # Sort by timestamp
-            )
-            
+        """Enforce cache size limits by removing least recently used entries."""
+        if self._estimated_size > self.max_cache_size_bytes:
+            # Remove entries from the LRU end until under limit, leaving some headroom
+            memory_cache = self._memory_cache
+            drop_entry = self._drop_entry
+            target_size = self.max_cache_size_bytes * 0.8
             removed_count = 0
-            for stop_code, _ in sorted_entries:
-                self._memory_cache.pop(stop_code, None)
-                self._cache_timestamps.pop(stop_code, None)
+            while memory_cache and self._estimated_size > target_size:
+                drop_entry(next(iter(memory_cache)))
                 removed_count += 1
-                
-                # Recalculate size
-                estimated_size = sum(
-                    len(json.dumps(data, ensure_ascii=False))
-                    for data in self._memory_cache.values()
-                )
-                
-                if estimated_size <= self.max_cache_size_bytes * 0.8:  # Leave some headroom
-                    break
             
             if removed_count > 0:
                 _LOGGER.info(
@@ -272,47 +470,56 @@ class MuniTimesCache:
     
     def get_cache_info(self) -> dict[str, Any]:
         """Get information about the current cache state."""
-        current_time = dt_util.utcnow()
+        current_time = time.monotonic()
         
         # Calculate cache statistics
         total_entries = len(self._memory_cache)
         valid_entries = 0
         expired_entries = 0
         
+        get_entry = self._memory_cache.get
+        duration_for = self._duration_for
         for stop_code, cached_at in self._cache_timestamps.items():
             age = current_time - cached_at
-            if age <= self.cache_duration:
+            if age <= duration_for(get_entry(stop_code, {})):
                 valid_entries += 1
             else:
                 expired_entries += 1
         
-        # Calculate estimated size
-        estimated_size_bytes = sum(
-            len(json.dumps(data, ensure_ascii=False))
-            for data in self._memory_cache.values()
-        )
-        
-        # Get file size if cache file exists
-        file_size_bytes = 0
-        if self.cache_file.exists():
-            file_size_bytes = self.cache_file.stat().st_size
+        # Estimated from the serialized entries, which is also what the stop files hold
+        estimated_size_bytes = self._estimated_size
         
         return {
             "total_entries": total_entries,
             "valid_entries": valid_entries,
             "expired_entries": expired_entries,
-            "cache_duration_minutes": self.cache_duration.total_seconds() / 60,
+            "cache_duration_minutes": self.cache_duration_seconds / 60,
             "estimated_memory_size_kb": estimated_size_bytes / 1024,
-            "file_size_kb": file_size_bytes / 1024,
             "max_cache_size_mb": self.max_cache_size_bytes / (1024 * 1024),
             "cache_directory": str(self.cache_dir),
-            "cache_file_exists": self.cache_file.exists(),
+            "has_entries": bool(self._entry_sizes),
         }
     
     async def has_cached_data(self, stop_code: str) -> bool:
         """Check if we have valid cached data for a stop."""
-        cached_data = await self.get_cached_data(stop_code)
-        return cached_data is not None
+        entry = self._memory_cache.get(stop_code)
+        cached_at = self._cache_timestamps.get(stop_code)
+        if entry is None or cached_at is None:
+            return False
+        return time.monotonic() - cached_at <= self._duration_for(entry)
+    
+    async def has_any_cached_data(self, stop_codes: Iterable[str]) -> bool:
+        """Check if any of the given stops has valid cached data."""
+        async with self._lock:
+            current_time = time.monotonic()
+            for stop_code in stop_codes:
+                cached_at = self._cache_timestamps.get(stop_code)
+                if cached_at is not None and stop_code in self._memory_cache:
+                    age = current_time - cached_at
+                    if age <= self._duration_for(self._memory_cache[stop_code]):
+                        return True
+        
+        return False
     
     def get_cached_stop_codes(self) -> list[str]:
         """Get list of stop codes that have cached data."""
@@ -321,12 +528,15 @@ class MuniTimesCache:
     async def cleanup(self) -> None:
         """Clean up cache resources."""
         try:
+            # Let a pending debounced save finish; cancelling can't stop a write in progress
+            if self._save_task is not None and not self._save_task.done():
+                await self._save_task
+            
             # Save final state to disk
             await self._save_cache_to_disk()
             
             # Clear memory cache
-            self._memory_cache.clear()
-            self._cache_timestamps.clear()
+            self._reset_entries()
             
             _LOGGER.debug("Cache cleanup completed")
             
@@ -1,7 +1,10 @@
 """Config flow for Muni Times integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from types import MappingProxyType
 from typing import Any
 
 import voluptuous as vol
@@ -10,6 +13,7 @@ from homeassistant import config_entries
 from homeassistant.core import HomeAssistant
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from .const import (
     CONF_AGENCY,
@@ -42,27 +46,72 @@ from .const import (
     TIME_FORMAT_FULL,
     TIME_FORMAT_MINUTES,
     TIME_FORMAT_VERBOSE,
+    VALIDATION_CACHE_TTL,
+    VALIDATION_RETRY_ATTEMPTS,
+    VALIDATION_RETRY_DELAY,
+)
+from .exceptions import (
+    MuniAPIError,
+    MuniConnectionError,
+    MuniRateLimitError,
+    MuniServiceUnavailableError,
+    MuniTimeoutError,
 )
 from .muni_api import MuniAPI
 
+__all__ = [
+    "CannotConnect",
+    "ConfigFlow",
+    "InvalidAuth",
+    "OptionsFlow",
+    "validate_input",
+]
+
 _LOGGER = logging.getLogger(__name__)
 
+# Defaults for options that are only configurable from the options flow
+_USER_DEFAULTS = MappingProxyType({
+    CONF_CACHE_ENABLED: DEFAULT_CACHE_ENABLED,
+    CONF_CACHE_DURATION: DEFAULT_CACHE_DURATION,
+    CONF_CACHE_MAX_SIZE: DEFAULT_CACHE_MAX_SIZE,
+    CONF_RETRY_MAX_ATTEMPTS: DEFAULT_RETRY_MAX_ATTEMPTS,
+    CONF_RETRY_DELAY: DEFAULT_RETRY_DELAY,
+    CONF_REQUEST_TIMEOUT: DEFAULT_REQUEST_TIMEOUT,
+})
+
+# Probe failures that are worth retrying and indicate a connectivity problem
+_TRANSIENT_ERRORS = (
+    MuniConnectionError,
+    MuniRateLimitError,
+    MuniServiceUnavailableError,
+    MuniTimeoutError,
+)
+
+# Monotonic time of the last successful validation per (api_key, agency)
+_VALIDATION_CACHE: dict[tuple[str, str], float] = {}
+
+# Field validators, built once and shared by the user and options schemas
+_UPDATE_INTERVAL_VALIDATOR = vol.All(int, vol.Range(min=30, max=3600))
+_MAX_RESULTS_VALIDATOR = vol.All(int, vol.Range(min=1, max=10))
+_TIME_FORMAT_VALIDATOR = vol.In([
+    TIME_FORMAT_MINUTES,
+    TIME_FORMAT_VERBOSE,
+    TIME_FORMAT_FULL
+])
+_CACHE_DURATION_VALIDATOR = vol.All(int, vol.Range(min=5, max=180))
+_CACHE_MAX_SIZE_VALIDATOR = vol.All(int, vol.Range(min=1, max=100))
+_RETRY_MAX_ATTEMPTS_VALIDATOR = vol.All(int, vol.Range(min=1, max=10))
+_RETRY_DELAY_VALIDATOR = vol.All(vol.Coerce(float), vol.Range(min=0.5, max=10.0))
+_REQUEST_TIMEOUT_VALIDATOR = vol.All(int, vol.Range(min=10, max=120))
+
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_API_KEY): str,
         vol.Optional(CONF_AGENCY, default=DEFAULT_AGENCY): str,
-        vol.Optional(CONF_UPDATE_INTERVAL, default=DEFAULT_UPDATE_INTERVAL): vol.All(
-            int, vol.Range(min=30, max=3600)
-        ),
-        vol.Optional(CONF_MAX_RESULTS, default=DEFAULT_MAX_RESULTS): vol.All(
-            int, vol.Range(min=1, max=10)
-        ),
+        vol.Optional(CONF_UPDATE_INTERVAL, default=DEFAULT_UPDATE_INTERVAL): _UPDATE_INTERVAL_VALIDATOR,
+        vol.Optional(CONF_MAX_RESULTS, default=DEFAULT_MAX_RESULTS): _MAX_RESULTS_VALIDATOR,
         vol.Optional(CONF_SHOW_LINE_ICONS, default=DEFAULT_SHOW_LINE_ICONS): bool,
-        vol.Optional(CONF_TIME_FORMAT, default=DEFAULT_TIME_FORMAT): vol.In([
-            TIME_FORMAT_MINUTES,
-            TIME_FORMAT_VERBOSE,
-            TIME_FORMAT_FULL
-        ]),
+        vol.Optional(CONF_TIME_FORMAT, default=DEFAULT_TIME_FORMAT): _TIME_FORMAT_VALIDATOR,
         vol.Optional(CONF_TIME_ZONE, default=DEFAULT_TIME_ZONE): str,
         vol.Required(CONF_STOPS): str,  # Comma-separated list of stop codes
     }
@@ -71,35 +120,17 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
 STEP_OPTIONS_SCHEMA = vol.Schema(
     {
         vol.Optional(CONF_STOPS): str,  # Comma-separated list of stop codes
-        vol.Optional(CONF_UPDATE_INTERVAL, default=DEFAULT_UPDATE_INTERVAL): vol.All(
-            int, vol.Range(min=30, max=3600)
-        ),
-        vol.Optional(CONF_MAX_RESULTS, default=DEFAULT_MAX_RESULTS): vol.All(
-            int, vol.Range(min=1, max=10)
-        ),
+        vol.Optional(CONF_UPDATE_INTERVAL, default=DEFAULT_UPDATE_INTERVAL): _UPDATE_INTERVAL_VALIDATOR,
+        vol.Optional(CONF_MAX_RESULTS, default=DEFAULT_MAX_RESULTS): _MAX_RESULTS_VALIDATOR,
         vol.Optional(CONF_SHOW_LINE_ICONS, default=DEFAULT_SHOW_LINE_ICONS): bool,
-        vol.Optional(CONF_TIME_FORMAT, default=DEFAULT_TIME_FORMAT): vol.In([
-            TIME_FORMAT_MINUTES,
-            TIME_FORMAT_VERBOSE,
-            TIME_FORMAT_FULL
-        ]),
+        vol.Optional(CONF_TIME_FORMAT, default=DEFAULT_TIME_FORMAT): _TIME_FORMAT_VALIDATOR,
         vol.Optional(CONF_TIME_ZONE, default=DEFAULT_TIME_ZONE): str,
         vol.Optional(CONF_CACHE_ENABLED, default=DEFAULT_CACHE_ENABLED): bool,
-        vol.Optional(CONF_CACHE_DURATION, default=DEFAULT_CACHE_DURATION): vol.All(
-            int, vol.Range(min=5, max=180)
-        ),
-        vol.Optional(CONF_CACHE_MAX_SIZE, default=DEFAULT_CACHE_MAX_SIZE): vol.All(
-            int, vol.Range(min=1, max=100)
-        ),
-        vol.Optional(CONF_RETRY_MAX_ATTEMPTS, default=DEFAULT_RETRY_MAX_ATTEMPTS): vol.All(
-            int, vol.Range(min=1, max=10)
-        ),
-        vol.Optional(CONF_RETRY_DELAY, default=DEFAULT_RETRY_DELAY): vol.All(
-            vol.Coerce(float), vol.Range(min=0.5, max=10.0)
-        ),
-        vol.Optional(CONF_REQUEST_TIMEOUT, default=DEFAULT_REQUEST_TIMEOUT): vol.All(
-            int, vol.Range(min=10, max=120)
-        ),
+        vol.Optional(CONF_CACHE_DURATION, default=DEFAULT_CACHE_DURATION): _CACHE_DURATION_VALIDATOR,
+        vol.Optional(CONF_CACHE_MAX_SIZE, default=DEFAULT_CACHE_MAX_SIZE): _CACHE_MAX_SIZE_VALIDATOR,
+        vol.Optional(CONF_RETRY_MAX_ATTEMPTS, default=DEFAULT_RETRY_MAX_ATTEMPTS): _RETRY_MAX_ATTEMPTS_VALIDATOR,
+        vol.Optional(CONF_RETRY_DELAY, default=DEFAULT_RETRY_DELAY): _RETRY_DELAY_VALIDATOR,
+        vol.Optional(CONF_REQUEST_TIMEOUT, default=DEFAULT_REQUEST_TIMEOUT): _REQUEST_TIMEOUT_VALIDATOR,
     }
 )
 
@@ -110,31 +141,44 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
     # Extract API configuration
     api_key = data[CONF_API_KEY]
     agency = data.get(CONF_AGENCY, DEFAULT_AGENCY)
-    max_retries = data.get(CONF_RETRY_MAX_ATTEMPTS, DEFAULT_RETRY_MAX_ATTEMPTS)
-    retry_delay = data.get(CONF_RETRY_DELAY, DEFAULT_RETRY_DELAY)
-    request_timeout = data.get(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT)
     
-    api = MuniAPI(
-        api_key=api_key,
-        agency=agency,
-        max_retries=max_retries,
-        retry_delay=retry_delay,
-        request_timeout=request_timeout,
-    )
-    
-    try:
-        # Try to make a test API call to validate the key
-        # Using a known SF Muni stop code for testing
-        test_data = await api.get_arrivals("13543")  # A real SF Muni stop
-        await api.close()
-        
-        # Return info that we want to store in the config entry
+    # Skip the probe if these credentials were validated recently
+    cache_key = (api_key, agency)
+    validated_at = _VALIDATION_CACHE.get(cache_key)
+    if validated_at is not None and time.monotonic() - validated_at < VALIDATION_CACHE_TTL:
+        _LOGGER.debug("Using recent validation result for agency %s", agency)
         return {"title": f"Muni Times ({agency})"}
-        
-    except Exception as e:
-        await api.close()
-        _LOGGER.error("API validation failed: %s", e)
-        raise InvalidAuth from e
+    
+    session = async_get_clientsession(hass)
+    
+    # Probe a known stop, retrying transient failures with backoff
+    for attempt in range(VALIDATION_RETRY_ATTEMPTS):
+        try:
+            valid = await MuniAPI.probe(session, api_key, agency)
+            break
+        except _TRANSIENT_ERRORS as e:
+            if attempt == VALIDATION_RETRY_ATTEMPTS - 1:
+                _LOGGER.error("API validation failed, cannot connect: %s", e)
+                raise CannotConnect from e
+            delay = VALIDATION_RETRY_DELAY * (2 ** attempt)
+            _LOGGER.debug(
+                "API validation attempt %d failed: %s. Retrying in %.1f seconds",
+                attempt + 1, e, delay
+            )
+            await asyncio.sleep(delay)
+        except MuniAPIError as e:
+            # Only a rejected key (probe returning False) means invalid auth
+            _LOGGER.error("API validation failed: %s", e)
+            raise CannotConnect from e
+    
+    if not valid:
+        _LOGGER.error("API validation failed: API key was rejected")
+        raise InvalidAuth
+    
+    _VALIDATION_CACHE[cache_key] = time.monotonic()
+    
+    # Return info that we want to store in the config entry
+    return {"title": f"Muni Times ({agency})"}
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -155,13 +199,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         
         if user_input is not None:
             try:
-                # Add default values for new configuration options
-                user_input.setdefault(CONF_CACHE_ENABLED, DEFAULT_CACHE_ENABLED)
-                user_input.setdefault(CONF_CACHE_DURATION, DEFAULT_CACHE_DURATION)
-                user_input.setdefault(CONF_CACHE_MAX_SIZE, DEFAULT_CACHE_MAX_SIZE)
-                user_input.setdefault(CONF_RETRY_MAX_ATTEMPTS, DEFAULT_RETRY_MAX_ATTEMPTS)
-                user_input.setdefault(CONF_RETRY_DELAY, DEFAULT_RETRY_DELAY)
-                user_input.setdefault(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT)
+                # Add default values for options not shown in the user step
+                user_input = _USER_DEFAULTS | user_input
                 
                 info = await validate_input(self.hass, user_input)
             except CannotConnect:
@@ -215,60 +254,11 @@ class OptionsFlow(config_entries.OptionsFlow):
         
         # Convert current stops to comma-separated string for display
         current_stops = current_config.get(CONF_STOPS, [])
-        stops_string = ", ".join([stop.get("stop_code", "") for stop in current_stops if stop.get("stop_code")])
+        current_config[CONF_STOPS] = ", ".join([stop.get("stop_code", "") for stop in current_stops if stop.get("stop_code")])
         
-        # Create schema with current values as defaults
-        options_schema = vol.Schema(
-            {
-                vol.Optional(
-                    CONF_STOPS,
-                    default=stops_string
-                ): str,
-                vol.Optional(
-                    CONF_UPDATE_INTERVAL,
-                    default=current_config.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
-                ): vol.All(int, vol.Range(min=30, max=3600)),
-                vol.Optional(
-                    CONF_MAX_RESULTS,
-                    default=current_config.get(CONF_MAX_RESULTS, DEFAULT_MAX_RESULTS)
-                ): vol.All(int, vol.Range(min=1, max=10)),
-                vol.Optional(
-                    CONF_SHOW_LINE_ICONS,
-                    default=current_config.get(CONF_SHOW_LINE_ICONS, DEFAULT_SHOW_LINE_ICONS)
-                ): bool,
-                vol.Optional(
-                    CONF_TIME_FORMAT,
-                    default=current_config.get(CONF_TIME_FORMAT, DEFAULT_TIME_FORMAT)
-                ): vol.In([TIME_FORMAT_MINUTES, TIME_FORMAT_VERBOSE, TIME_FORMAT_FULL]),
-                vol.Optional(
-                    CONF_TIME_ZONE,
-                    default=current_config.get(CONF_TIME_ZONE, DEFAULT_TIME_ZONE)
-                ): str,
-                vol.Optional(
-                    CONF_CACHE_ENABLED,
-                    default=current_config.get(CONF_CACHE_ENABLED, DEFAULT_CACHE_ENABLED)
-                ): bool,
-                vol.Optional(
-                    CONF_CACHE_DURATION,
-                    default=current_config.get(CONF_CACHE_DURATION, DEFAULT_CACHE_DURATION)
-                ): vol.All(int, vol.Range(min=5, max=180)),
-                vol.Optional(
-                    CONF_CACHE_MAX_SIZE,
-                    default=current_config.get(CONF_CACHE_MAX_SIZE, DEFAULT_CACHE_MAX_SIZE)
-                ): vol.All(int, vol.Range(min=1, max=100)),
-                vol.Optional(
-                    CONF_RETRY_MAX_ATTEMPTS,
-                    default=current_config.get(CONF_RETRY_MAX_ATTEMPTS, DEFAULT_RETRY_MAX_ATTEMPTS)
-                ): vol.All(int, vol.Range(min=1, max=10)),
-                vol.Optional(
-                    CONF_RETRY_DELAY,
-                    default=current_config.get(CONF_RETRY_DELAY, DEFAULT_RETRY_DELAY)
-                ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=10.0)),
-                vol.Optional(
-                    CONF_REQUEST_TIMEOUT,
-                    default=current_config.get(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT)
-                ): vol.All(int, vol.Range(min=10, max=120)),
-            }
+        # Pre-fill the shared options schema with the current values
+        options_schema = self.add_suggested_values_to_schema(
+            STEP_OPTIONS_SCHEMA, current_config
         )
 
         return self.async_show_form(
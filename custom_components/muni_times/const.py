@@ -31,9 +31,12 @@ DEFAULT_CACHE_MAX_SIZE = 10  # MB
 DEFAULT_RETRY_MAX_ATTEMPTS = 3
 DEFAULT_RETRY_DELAY = 1.0  # seconds
 DEFAULT_REQUEST_TIMEOUT = 30  # seconds
+DEFAULT_RESPONSE_CACHE_TTL = 15  # seconds, below the minimum update interval
 
 # API constants
 API_ENDPOINT = "https://api.511.org/transit/StopMonitoring"
+TEST_STOP_CODE = "13543"  # A real SF Muni stop used for connection checks
+PROBE_TIMEOUT = 5  # seconds
 
 # Time format options
 TIME_FORMAT_MINUTES = "minutes"
@@ -51,13 +54,21 @@ LINE_ICONS = {
 }
 
 # Trolleybus routes in SF Muni
-TROLLEYBUS_ROUTES = ["1", "2", "3", "5", "6", "7", "8", "14", "21", "22", "24", "30", "31", "33", "41", "45", "49"]
+TROLLEYBUS_ROUTES = frozenset({"1", "2", "3", "5", "6", "7", "8", "14", "21", "22", "24", "30", "31", "33", "41", "45", "49"})
 
 # Cable car lines
-CABLE_CAR_LINES = ["C", "PM", "PH", "59", "60", "61"]
+CABLE_CAR_LINES = frozenset({"C", "PM", "PH", "59", "60", "61"})
 
 # Metro/streetcar lines
-METRO_LINES = ["J", "K", "L", "M", "N", "T", "S", "E", "F"]
+METRO_LINES = frozenset({"J", "K", "L", "M", "N", "T", "S", "E", "F"})
+
+# Pre-resolved icons for known routes. Numeric routes are classified as
+# buses/trolleybuses first, so numeric cable car refs are not mapped here.
+ROUTE_ICON_MAP = {
+    **{line: LINE_ICONS["metro"] for line in METRO_LINES},
+    **{line: LINE_ICONS["cable_car"] for line in CABLE_CAR_LINES if not line.isdigit()},
+    **{route: LINE_ICONS["trolleybus"] for route in TROLLEYBUS_ROUTES},
+}
 
 # Retry and error handling constants
 RETRY_EXPONENTIAL_BASE = 2.0
@@ -68,6 +79,17 @@ RETRY_JITTER = True
 CONNECTION_POOL_SIZE = 10
 CONNECTION_POOL_TTL = 300  # seconds
 DNS_CACHE_TTL = 300  # seconds
+MAX_CONCURRENT_REQUESTS = 8  # parallel stop fetches per coordinator update
+# The agency-wide feed is several MB against a few KB per stop, so it only
+# pays off once a single poll would otherwise issue many requests
+BULK_FETCH_MIN_STOPS = 10  # use one agency-wide request from this many stops
+FETCH_DEADLINE_RATIO = 0.9  # share of the update interval per-stop fetches may take
+PARSE_IN_EXECUTOR_MIN_BYTES = 16384  # parse larger response bodies off the event loop
+
+# Adaptive polling: (next arrival within N seconds, refresh interval in seconds)
+ADAPTIVE_POLL_TIERS = ((180, 30), (600, 60))
+ADAPTIVE_POLL_MAX_INTERVAL = 300  # seconds, for distant or no arrivals
+ADAPTIVE_POLL_SLACK = 5  # seconds of tolerance when checking if a stop is due
 
 # Rate limiting constants
 DEFAULT_RATE_LIMIT_REQUESTS = 60  # requests per minute
@@ -77,17 +99,26 @@ DEFAULT_RATE_LIMIT_WINDOW = 60  # seconds
 HEALTH_CHECK_WINDOW_SIZE = 10  # number of recent operations to track
 HEALTH_CHECK_FAILURE_THRESHOLD = 5  # consecutive failures before marking unhealthy
 HEALTH_CHECK_SUCCESS_RATE_THRESHOLD = 0.5  # minimum success rate to be considered healthy
+DIAGNOSTICS_CACHE_TTL = 5  # seconds a diagnostics snapshot is reused
 
 # Cache constants
 CACHE_FILE_NAME = "transit_data.json"
 CACHE_METADATA_FILE_NAME = "cache_metadata.json"
 CACHE_CLEANUP_INTERVAL = 300  # seconds
 CACHE_VERSION = "1.0"
+CACHE_SAVE_DELAY = 0.5  # seconds to coalesce cache writes into one disk save
+CACHE_MIN_TTL = 120  # seconds, floor for per-stop TTLs derived from predictions
+RESPONSE_CACHE_MAX_ENTRIES = 64  # in-memory API responses kept by MuniAPI
 
 # Error retry classifications
 RETRYABLE_HTTP_CODES = [429, 500, 502, 503, 504]  # HTTP codes that should trigger retries
 NON_RETRYABLE_HTTP_CODES = [400, 401, 403, 404]  # HTTP codes that should not trigger retries
 
+# Config flow constants
+VALIDATION_CACHE_TTL = 600  # seconds a successful API key validation is reused
+VALIDATION_RETRY_ATTEMPTS = 3
+VALIDATION_RETRY_DELAY = 0.5  # seconds, doubled after each failed attempt
+
 # Service constants
 SERVICE_REFRESH_DATA = "refresh_data"
 SERVICE_CLEAR_CACHE = "clear_cache"
@@ -95,6 +126,9 @@ SERVICE_TEST_CONNECTION = "test_connection"
 SERVICE_GET_DIAGNOSTICS = "get_diagnostics"
 SERVICE_RESET_ERROR_COUNT = "reset_error_count"
 
+# Events
+EVENT_CACHE_INVALIDATED = f"{DOMAIN}_cache_invalidated"
+
 # Sensor attributes for error states
 ATTR_ERROR_COUNT = "error_count"
 ATTR_LAST_ERROR = "last_error"
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import logging
+import time
 from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
@@ -53,10 +54,12 @@ async def async_get_config_entry_diagnostics(
     
     # Add rate limiter status if available  
     if hasattr(coordinator.api, "rate_limiter"):
+        rate_limiter = coordinator.api.rate_limiter
+        now = time.monotonic()
         diagnostics["api_status"]["rate_limiter"] = {
-            "current_rate": coordinator.api.rate_limiter.current_rate,
-            "time_until_reset": coordinator.api.rate_limiter.time_until_reset,
-            "max_requests": coordinator.api.rate_limiter.max_requests,
+            "current_rate": rate_limiter.get_current_rate(now),
+            "time_until_reset": rate_limiter.get_time_until_reset(now),
+            "max_requests": rate_limiter.max_requests,
         }
     
     # Add cache status if available
@@ -83,12 +86,10 @@ async def async_get_config_entry_diagnostics(
         # Add data information if available
         if coordinator.data and stop_code in coordinator.data:
             stop_data = coordinator.data[stop_code]
-            arrivals = stop_data.get("arrivals", [])
+            arrivals = stop_data.arrivals
             
             stop_info["arrival_count"] = len(arrivals)
-            stop_info["line_count"] = len(set(
-                arrival.get("line_ref", "") for arrival in arrivals
-            ))
+            stop_info["line_count"] = len({arrival.get("line_ref", "") for arrival in arrivals})
             
             # Get timestamp from first arrival if available
             if arrivals and arrivals[0].get("times"):
@@ -105,11 +106,10 @@ async def async_get_device_diagnostics(
 ) -> dict[str, Any]:
     """Return diagnostics for a device."""
     # Extract stop code from device identifiers
-    stop_code = None
-    for identifier in device.identifiers:
-        if identifier[0] == DOMAIN:
-            stop_code = identifier[1]
-            break
+    stop_code = next(
+        (identifier[1] for identifier in device.identifiers if identifier[0] == DOMAIN),
+        None,
+    )
     
     if not stop_code:
         return {"error": "Could not determine stop code from device"}
@@ -117,11 +117,7 @@ async def async_get_device_diagnostics(
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
     
     # Find the stop configuration
-    stop_config = None
-    for stop in coordinator.stops:
-        if stop.get("stop_code") == stop_code:
-            stop_config = stop
-            break
+    stop_config = coordinator._stops_by_code.get(stop_code)
     
     diagnostics = {
         "device": {
@@ -142,9 +138,9 @@ async def async_get_device_diagnostics(
     if coordinator.data and stop_code in coordinator.data:
         stop_data = coordinator.data[stop_code]
         diagnostics["current_data"] = {
-            "arrivals_count": len(stop_data.get("arrivals", [])),
+            "arrivals_count": len(stop_data.arrivals),
             "last_updated": coordinator.last_successful_update.isoformat() if coordinator.last_successful_update else None,
-            "arrivals": stop_data.get("arrivals", []),
+            "arrivals": stop_data.arrivals,
         }
     
     # Add cached data if available
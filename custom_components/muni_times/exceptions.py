@@ -1,6 +1,9 @@
 """Custom exceptions for Muni Times integration."""
 from __future__ import annotations
 
+import re
+
+import aiohttp
 from homeassistant.exceptions import HomeAssistantError
 
 
@@ -49,16 +52,22 @@ class MuniConfigurationError(MuniTimesError):
 
 
 # Error classification helpers
+_TIMEOUT_ERROR_RE = re.compile("timeout", re.IGNORECASE)
+_CONNECTION_ERROR_RE = re.compile("connection|network|ssl|certificate", re.IGNORECASE)
+
+_HTTP_ERROR_MAP: dict[int, type[MuniAPIError]] = {
+    401: MuniAuthenticationError,
+    403: MuniAuthenticationError,
+    404: MuniInvalidStopError,
+    429: MuniRateLimitError,
+}
+
+
 def classify_http_error(status_code: int) -> type[MuniAPIError]:
     """Classify HTTP errors into specific exception types."""
-    if status_code == 401:
-        return MuniAuthenticationError
-    elif status_code == 403:
-        return MuniAuthenticationError
-    elif status_code == 404:
-        return MuniInvalidStopError
-    elif status_code == 429:
-        return MuniRateLimitError
+    error_class = _HTTP_ERROR_MAP.get(status_code)
+    if error_class is not None:
+        return error_class
     elif status_code >= 500:
         return MuniServiceUnavailableError
     elif status_code >= 400:
@@ -69,13 +78,17 @@ def classify_http_error(status_code: int) -> type[MuniAPIError]:
 
 def classify_connection_error(error: Exception) -> type[MuniAPIError]:
     """Classify connection errors into specific exception types."""
-    error_str = str(error).lower()
-    
-    if "timeout" in error_str:
+    # Known exception types first; this also covers timeouts whose message is empty
+    if isinstance(error, TimeoutError):
         return MuniTimeoutError
-    elif "connection" in error_str or "network" in error_str:
+    if isinstance(error, aiohttp.ClientConnectionError):
         return MuniConnectionError
-    elif "ssl" in error_str or "certificate" in error_str:
+    
+    # Fall back to the message for anything else
+    error_str = str(error)
+    if _TIMEOUT_ERROR_RE.search(error_str):
+        return MuniTimeoutError
+    elif _CONNECTION_ERROR_RE.search(error_str):
         return MuniConnectionError
     else:
-        return MuniAPIError
\ No newline at end of file
+        return MuniAPIError
@@ -0,0 +1,19 @@
+"""Data models for Muni Times integration."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+
+@dataclass(slots=True)
+class StopData:
+    """A stop's latest arrivals as held by the coordinator."""
+
+    arrivals: list[dict[str, Any]]
+    config: dict[str, Any]
+    from_cache: bool = False
+    cached_at: str | None = None
+    cache_age_minutes: float = 0
+    last_updated: datetime | None = None
+    lines: list[dict[str, Any]] = field(default_factory=list)  # pre-formatted for sensors
@@ -2,21 +2,32 @@
 from __future__ import annotations
 
 import asyncio
+import codecs
+import functools
 import json
 import logging
+import sys
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Any
 
 import aiohttp
+from yarl import URL
+
+try:
+    import aiodns
+except ImportError:  # pragma: no cover - aiodns ships with Home Assistant
+    aiodns = None
 
 from .const import (
     API_ENDPOINT,
-    CABLE_CAR_LINES,
     CONNECTION_POOL_SIZE,
     CONNECTION_POOL_TTL,
     DEFAULT_RATE_LIMIT_REQUESTS,
     DEFAULT_RATE_LIMIT_WINDOW,
     DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_RESPONSE_CACHE_TTL,
     DEFAULT_RETRY_DELAY,
     DEFAULT_RETRY_MAX_ATTEMPTS,
     DNS_CACHE_TTL,
@@ -24,16 +35,19 @@ from .const import (
     HEALTH_CHECK_SUCCESS_RATE_THRESHOLD,
     HEALTH_CHECK_WINDOW_SIZE,
     LINE_ICONS,
-    METRO_LINES,
     NON_RETRYABLE_HTTP_CODES,
+    PARSE_IN_EXECUTOR_MIN_BYTES,
+    PROBE_TIMEOUT,
+    RESPONSE_CACHE_MAX_ENTRIES,
     RETRYABLE_HTTP_CODES,
     RETRY_EXPONENTIAL_BASE,
     RETRY_JITTER,
     RETRY_MAX_DELAY,
+    ROUTE_ICON_MAP,
+    TEST_STOP_CODE,
     TIME_FORMAT_FULL,
     TIME_FORMAT_MINUTES,
     TIME_FORMAT_VERBOSE,
-    TROLLEYBUS_ROUTES,
 )
 from .exceptions import (
     MuniAPIError,
@@ -47,10 +61,19 @@ from .exceptions import (
     classify_connection_error,
     classify_http_error,
 )
-from .utils import ConnectionHealthMonitor, RateLimiter, retry_on_failure, sanitize_stop_code
+from .utils import (
+    ConnectionHealthMonitor,
+    RateLimiter,
+    json_loads,
+    retry_on_failure,
+    sanitize_stop_code,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Icons by line ref, seeded with the known routes and extended as other lines are seen
+_LINE_ICON_CACHE: dict[str, str] = dict(ROUTE_ICON_MAP)
+
 
 class MuniAPI:
     """API client for 511.org transit data with enhanced error handling and retry logic."""
@@ -65,10 +88,18 @@ class MuniAPI:
         request_timeout: int = DEFAULT_REQUEST_TIMEOUT,
         rate_limit_requests: int = DEFAULT_RATE_LIMIT_REQUESTS,
         rate_limit_window: int = DEFAULT_RATE_LIMIT_WINDOW,
+        response_cache_ttl: float = DEFAULT_RESPONSE_CACHE_TTL,
+        response_cache_max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
     ) -> None:
         """Initialize the API client with enhanced error handling."""
         self.api_key = api_key
         self.agency = agency
+        
+        # Static query parameters are encoded once; requests only add their own
+        self._base_url = URL(API_ENDPOINT).with_query(
+            api_key=api_key, agency=agency, format="json"
+        )
+        
         self._session = session
         self._close_session = False
         
@@ -76,6 +107,16 @@ class MuniAPI:
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.request_timeout = request_timeout
+        self._client_timeout = aiohttp.ClientTimeout(total=request_timeout)
+        
+        # Retry requests with the configured attempts and delay
+        self._request_stop_monitoring = retry_on_failure(
+            max_retries=max_retries,
+            base_delay=retry_delay,
+            max_delay=RETRY_MAX_DELAY,
+            exponential_base=RETRY_EXPONENTIAL_BASE,
+            jitter=RETRY_JITTER,
+        )(self._request_stop_monitoring)
         
         # Health monitoring
         self.health_monitor = ConnectionHealthMonitor(window_size=HEALTH_CHECK_WINDOW_SIZE)
@@ -86,91 +127,300 @@ class MuniAPI:
             time_window=rate_limit_window,
         )
         
+        # Short-lived response cache keyed by "agency:stop_code" (LRU ordered)
+        self.response_cache_ttl = response_cache_ttl
+        self.response_cache_max_entries = response_cache_max_entries
+        self._response_cache: OrderedDict[str, tuple[float, list[dict[str, Any]]]] = OrderedDict()
+        
+        # In-flight per-stop fetches, shared by concurrent callers
+        self._pending: dict[str, asyncio.Task] = {}
+        
+        # Conditional request validators: key -> (ETag, Last-Modified, visits)
+        self._validators: dict[str, tuple[str | None, str | None, list[dict[str, str]]]] = {}
+        
         # Connection configuration
         self._connector_kwargs = {
             "limit": CONNECTION_POOL_SIZE,
+            "limit_per_host": CONNECTION_POOL_SIZE,
             "ttl_dns_cache": DNS_CACHE_TTL,
             "use_dns_cache": True,
             "keepalive_timeout": CONNECTION_POOL_TTL,
             "enable_cleanup_closed": True,
         }
 
-    @retry_on_failure(
-        max_retries=DEFAULT_RETRY_MAX_ATTEMPTS,
-        base_delay=DEFAULT_RETRY_DELAY,
-        max_delay=RETRY_MAX_DELAY,
-        exponential_base=RETRY_EXPONENTIAL_BASE,
-        jitter=RETRY_JITTER,
-    )
+    @classmethod
+    async def probe(
+        cls,
+        session: aiohttp.ClientSession,
+        api_key: str,
+        agency: str,
+        test_stop_code: str = TEST_STOP_CODE,
+    ) -> bool:
+        """Check an API key with a single lightweight request.
+
+        Unlike get_arrivals this skips retries, caching, rate limiting and
+        health tracking. Returns False when the key is rejected and raises a
+        classified MuniAPIError for other failures.
+        """
+        params = {
+            "api_key": api_key,
+            "agency": agency,
+            "stopcode": test_stop_code,
+            "format": "json",
+        }
+        
+        try:
+            async with session.get(
+                API_ENDPOINT,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT),
+            ) as response:
+                if response.status in (401, 403):
+                    return False
+                if response.status != 200:
+                    raise classify_http_error(response.status)(
+                        f"API probe failed with status {response.status}"
+                    )
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise classify_connection_error(e)(f"Connection error: {e}") from e
+
     async def get_arrivals(self, stop_code: str) -> list[dict[str, Any]]:
-        """Get arrival information for a stop with retry logic and error handling."""
+        """Get arrival information for a stop, served from the response cache if fresh.
+
+        Concurrent calls for the same stop share a single request.
+        """
+        cached = self._get_cached_response(stop_code)
+        if cached is not None:
+            _LOGGER.debug("Using cached response for stop %s", stop_code)
+            return cached
+        
+        # Join an in-flight request for the same stop instead of issuing another
+        pending = self._pending.get(stop_code)
+        if pending is not None:
+            _LOGGER.debug("Joining in-flight request for stop %s", stop_code)
+        else:
+            pending = self._start_fetch(stop_code)
+        
+        # Shielded so one caller's cancellation doesn't abort the shared request
+        return await asyncio.shield(pending)
+
+    def _start_fetch(self, stop_code: str) -> asyncio.Task:
+        """Start a shared fetch for a stop that stores its result in the response cache."""
+        task = asyncio.ensure_future(self._fetch_and_store(stop_code))
+        self._pending[stop_code] = task
+        task.add_done_callback(functools.partial(self._fetch_done, stop_code))
+        return task
+
+    async def _fetch_and_store(self, stop_code: str) -> list[dict[str, Any]]:
+        """Fetch arrivals for a stop and store them in the response cache."""
+        arrivals = await self._fetch_arrivals(stop_code)
+        self._store_cached_response(stop_code, arrivals)
+        return arrivals
+
+    def _fetch_done(self, stop_code: str, task: asyncio.Task) -> None:
+        """Forget a finished fetch and consume its error if every caller stopped waiting."""
+        if self._pending.get(stop_code) is task:
+            del self._pending[stop_code]
+        
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.debug("Request for stop %s failed: %s", stop_code, task.exception())
+
+    async def _fetch_arrivals(self, stop_code: str) -> list[dict[str, Any]]:
+        """Fetch arrival information for a stop with retry logic and error handling."""
+        # Sanitize once; only the request itself is retried
         try:
-            # Sanitize stop code
             sanitized_stop_code = sanitize_stop_code(stop_code)
-            
+        except ValueError as e:
+            raise MuniInvalidStopError(str(e)) from e
+        
+        visits = await self._request_stop_monitoring(
+            {"stopcode": sanitized_stop_code}, f"stop {sanitized_stop_code}"
+        )
+        
+        # Format arrivals
+        formatted_arrivals = self._format_visits(visits)
+        
+        # Record success
+        self.health_monitor.record_success()
+        
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(
+                "Successfully fetched %d arrivals for stop %s",
+                len(formatted_arrivals), sanitized_stop_code
+            )
+        
+        return formatted_arrivals
+
+    async def get_arrivals_bulk(self, stop_codes: list[str]) -> dict[str, list[dict[str, Any]]]:
+        """Get arrivals for several stops from a single agency-wide request.
+
+        StopMonitoring returns every monitored visit for the agency when no
+        stop code is given, so one round-trip covers all configured stops.
+        Visits are bucketed by stop and stops without visits map to an
+        empty list.
+        """
+        try:
+            sanitized_codes = {
+                stop_code: sanitize_stop_code(stop_code) for stop_code in stop_codes
+            }
+        except ValueError as e:
+            raise MuniInvalidStopError(str(e)) from e
+        
+        visits = await self._request_stop_monitoring({}, f"agency {self.agency}")
+        
+        # Bucket visits by the stop they belong to
+        visits_by_stop: dict[str, list[dict[str, str]]] = {}
+        for visit in visits:
+            if visit["stop_ref"]:
+                visits_by_stop.setdefault(visit["stop_ref"], []).append(visit)
+        
+        results = {
+            stop_code: self._format_visits(visits_by_stop.get(sanitized, []))
+            for stop_code, sanitized in sanitized_codes.items()
+        }
+        
+        self.health_monitor.record_success()
+        
+        for stop_code, arrivals in results.items():
+            self._store_cached_response(stop_code, arrivals)
+        
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(
+                "Successfully fetched arrivals for %d stops in one request",
+                len(results)
+            )
+        
+        return results
+
+    def _get_cached_response(self, stop_code: str) -> list[dict[str, Any]] | None:
+        """Return cached arrivals for a stop, dropping the entry once past the TTL."""
+        if self.response_cache_ttl <= 0:
+            return None
+        
+        key = f"{self.agency}:{stop_code}"
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, arrivals = entry
+        age = time.monotonic() - stored_at
+        if age >= self.response_cache_ttl:
+            del self._response_cache[key]
+            return None
+        
+        self._response_cache.move_to_end(key)
+        return arrivals
+
+    def invalidate(self, stop_code: str | None = None) -> None:
+        """Drop cached responses for a stop, or for all stops."""
+        if stop_code is None:
+            self._response_cache.clear()
+        else:
+            self._response_cache.pop(f"{self.agency}:{stop_code}", None)
+
+    def _store_cached_response(self, stop_code: str, arrivals: list[dict[str, Any]]) -> None:
+        """Store arrivals for a stop, evicting the least recently used entries."""
+        if self.response_cache_ttl <= 0:
+            return
+        
+        key = f"{self.agency}:{stop_code}"
+        self._response_cache[key] = (time.monotonic(), arrivals)
+        self._response_cache.move_to_end(key)
+        
+        while len(self._response_cache) > self.response_cache_max_entries:
+            self._response_cache.popitem(last=False)
+
+    async def _request_stop_monitoring(
+        self, params: dict[str, str], context: str
+    ) -> list[dict[str, str]]:
+        """Perform a StopMonitoring request and return its projected visits.
+
+        Transient failures are retried here (wrapped per instance in
+        __init__ with the configured retry settings), so callers' setup
+        and formatting run once. Responses are revalidated with
+        ETag/Last-Modified; on HTTP 304 the visits from the previous
+        response are returned without reading or parsing a body.
+        """
+        validator_key = params.get("stopcode", "*")
+        etag, last_modified, previous_visits = self._validators.get(
+            validator_key, (None, None, None)
+        )
+        
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        
+        try:
             # Apply rate limiting
             await self.rate_limiter.wait_if_needed()
             
-            # Build URL
-            url = f"{API_ENDPOINT}?api_key={self.api_key}&agency={self.agency}&stopcode={sanitized_stop_code}&format=json"
+            # Build the request URL from the pre-encoded base
+            url = self._base_url.update_query(params) if params else self._base_url
             
             session = await self._get_session()
             
-            # Make request with timeout
-            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
-            
-            async with session.get(url, timeout=timeout) as response:
+            # Make request with timeout; a shared session may use a different default
+            async with session.get(
+                url, headers=headers, timeout=self._client_timeout
+            ) as response:
+                # Unchanged since the last response
+                if response.status == 304 and previous_visits is not None:
+                    _LOGGER.debug("Response not modified for %s", context)
+                    return previous_visits
+                
                 # Handle HTTP errors
                 if response.status in NON_RETRYABLE_HTTP_CODES:
                     error_class = classify_http_error(response.status)
                     error_msg = f"API request failed with status {response.status}"
-                    _LOGGER.error("%s for stop %s", error_msg, sanitized_stop_code)
+                    _LOGGER.error("%s for %s", error_msg, context)
                     self.health_monitor.record_failure()
                     raise error_class(error_msg)
                 
                 elif response.status in RETRYABLE_HTTP_CODES:
                     error_class = classify_http_error(response.status)
                     error_msg = f"API request failed with retryable status {response.status}"
-                    _LOGGER.warning("%s for stop %s", error_msg, sanitized_stop_code)
+                    _LOGGER.warning("%s for %s", error_msg, context)
                     self.health_monitor.record_failure()
                     raise error_class(error_msg)
                 
                 elif response.status != 200:
                     error_msg = f"API request failed with unexpected status {response.status}"
-                    _LOGGER.error("%s for stop %s", error_msg, sanitized_stop_code)
+                    _LOGGER.error("%s for %s", error_msg, context)
                     self.health_monitor.record_failure()
                     raise MuniAPIError(error_msg)
                 
-                # Read and process response
+                # Read and decode response; large (agency-wide) bodies are
+                # parsed in a worker thread so they don't block the event loop
                 try:
-                    text = await response.text()
-                    # Handle BOM character
-                    clean_text = text.encode().decode('utf-8-sig')
-                    data = json.loads(clean_text)
+                    raw = await response.read()
+                    if len(raw) >= PARSE_IN_EXECUTOR_MIN_BYTES:
+                        visits = await asyncio.to_thread(self._parse_visits, raw)
+                    else:
+                        visits = self._parse_visits(raw)
                 except json.JSONDecodeError as e:
                     error_msg = f"Invalid JSON response: {e}"
-                    _LOGGER.error("%s for stop %s", error_msg, sanitized_stop_code)
+                    _LOGGER.error("%s for %s", error_msg, context)
                     self.health_monitor.record_failure()
                     raise MuniDataFormatError(error_msg) from e
                 
-                # Format arrivals
-                formatted_arrivals = self._format_arrivals(data)
-                
-                # Record success
-                self.health_monitor.record_success()
-                
-                _LOGGER.debug(
-                    "Successfully fetched %d arrivals for stop %s",
-                    len(formatted_arrivals), sanitized_stop_code
-                )
+                # Remember validators so the next request can be conditional
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if etag or last_modified:
+                    self._validators[validator_key] = (etag, last_modified, visits)
+                else:
+                    self._validators.pop(validator_key, None)
                 
-                return formatted_arrivals
+                return visits
                 
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             # Handle connection errors
             error_class = classify_connection_error(e)
             error_msg = f"Connection error: {e}"
-            _LOGGER.error("%s for stop %s", error_msg, stop_code)
+            _LOGGER.error("%s for %s", error_msg, context)
             self.health_monitor.record_failure()
             raise error_class(error_msg) from e
         
@@ -181,15 +431,23 @@ class MuniAPI:
         except Exception as e:
             # Handle unexpected errors
             error_msg = f"Unexpected error: {e}"
-            _LOGGER.error("%s for stop %s", error_msg, stop_code)
+            _LOGGER.error("%s for %s", error_msg, context)
             self.health_monitor.record_failure()
             raise MuniAPIError(error_msg) from e
 
-    def _format_arrivals(self, data: dict) -> list[dict[str, Any]]:
-        """Format arrival data from API response with enhanced error handling."""
+    def _parse_visits(self, raw: bytes) -> list[dict[str, str]]:
+        """Decode a StopMonitoring response body into projected visits.
+
+        Touches no client state, so it is safe to run in a worker thread.
+        """
+        # Handle BOM character
+        if raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        return self._project_visits(self._extract_visits(json_loads(raw)))
+
+    def _extract_visits(self, data: dict) -> list[dict[str, Any]]:
+        """Extract the list of MonitoredStopVisit entries from an API response."""
         try:
-            arrivals = {}
-            
             # Validate response structure
             if not isinstance(data, dict):
                 raise MuniDataFormatError("Response is not a valid JSON object")
@@ -215,46 +473,94 @@ class MuniAPI:
             elif not isinstance(visits, list):
                 raise MuniDataFormatError("MonitoredStopVisit is not a list or dict")
             
+            return visits
+            
+        except MuniDataFormatError:
+            # Re-raise data format errors
+            raise
+        except Exception as e:
+            error_msg = f"Error parsing response: {e}"
+            _LOGGER.error(error_msg)
+            raise MuniDataFormatError(error_msg) from e
+
+    def _project_visits(self, visits: list[dict[str, Any]]) -> list[dict[str, str]]:
+        """Reduce raw SIRI visits to the few fields we use.
+
+        The projected visits are small flat dicts, so the full response tree
+        can be released as soon as they are built.
+        """
+        projected = []
+        append = projected.append
+        for visit in visits:
+            try:
+                # Skip visits missing the journey, call or expected arrival
+                try:
+                    journey = visit["MonitoredVehicleJourney"]
+                    call = journey["MonitoredCall"]
+                    arrival_time = call["ExpectedArrivalTime"]
+                except (KeyError, TypeError):
+                    continue
+                
+                line_ref = journey.get("LineRef", "").upper()
+                if not arrival_time or not line_ref:
+                    continue
+                
+                append({
+                    "stop_ref": str(visit.get("MonitoringRef") or call.get("StopPointRef") or ""),
+                    "line_ref": line_ref,
+                    "destination": journey.get("DestinationName", ""),
+                    "arrival_time": arrival_time,
+                })
+            
+            except Exception as e:
+                _LOGGER.warning("Error processing individual visit: %s", e)
+                continue
+        
+        return projected
+
+    def _format_visits(self, visits: list[dict[str, str]]) -> list[dict[str, Any]]:
+        """Group projected visits into per-line arrival entries."""
+        try:
+            arrivals = {}
+            now = datetime.now(timezone.utc)
+            
+            # Bind hot-loop lookups to locals
+            arrivals_get = arrivals.get
+            get_icon = self._get_line_icon
+            minutes_of = self._calculate_minutes_until_arrival
+            
             for visit in visits:
                 try:
-                    journey = visit.get("MonitoredVehicleJourney", {})
-                    if not journey or not journey.get("MonitoredCall"):
-                        continue
-                    
-                    line_ref = journey.get("LineRef", "").upper()
-                    destination = journey.get("DestinationName", "")
-                    arrival_time = journey.get("MonitoredCall", {}).get("ExpectedArrivalTime")
-                    
-                    if not arrival_time or not line_ref:
-                        continue
+                    line_ref = visit["line_ref"]
+                    destination = visit["destination"]
+                    arrival_time = visit["arrival_time"]
                     
                     # Calculate arrival time info
-                    minutes_until = self._calculate_minutes_until_arrival(arrival_time)
-                    
-                    # Get line icon
-                    line_icon = self._get_line_icon(line_ref)
+                    minutes_until = minutes_of(arrival_time, now)
                     
                     # Format line name with icon
+                    line_icon = get_icon(line_ref)
                     line_with_icon = f"{line_icon} {line_ref}" if line_icon else line_ref
                     
                     # Group arrivals by line
-                    if line_with_icon not in arrivals:
-                        arrivals[line_with_icon] = {
+                    entry = arrivals_get(line_with_icon)
+                    if entry is None:
+                        entry = arrivals[line_with_icon] = {
                             "line": line_with_icon,
                             "line_ref": line_ref,
-                            "destinations": set(),
+                            "destinations": {},  # insertion-ordered unique destinations
                             "times": []
                         }
                     
-                    arrivals[line_with_icon]["times"].append({
+                    entry["times"].append({
                         "minutes": minutes_until,
                         "arrival_time": arrival_time,
                         "destination": destination,
-                        "formatted_time": f"{minutes_until} min" if minutes_until != "?" else "?"
+                        "formatted_time": f"{minutes_until} min" if minutes_until is not None else "?"
                     })
                     
                     if destination:
-                        arrivals[line_with_icon]["destinations"].add(destination)
+                        entry["destinations"].setdefault(destination, None)
                 
                 except Exception as e:
                     _LOGGER.warning("Error processing individual visit: %s", e)
@@ -265,8 +571,8 @@ class MuniAPI:
             for line_data in arrivals.values():
                 try:
                     # Sort times by minutes
-                    line_data["times"].sort(key=lambda x: int(x["minutes"]) if x["minutes"] != "?" else 999)
-                    # Convert destinations set to list
+                    line_data["times"].sort(key=lambda x: x["minutes"] if x["minutes"] is not None else 999)
+                    # Unique destinations in first-seen order
                     line_data["destinations"] = list(line_data["destinations"])
                     formatted_arrivals.append(line_data)
                 except Exception as e:
@@ -275,11 +581,12 @@ class MuniAPI:
             
             # Sort by earliest arrival
             try:
-                formatted_arrivals.sort(key=lambda x: int(x["times"][0]["minutes"]) if x["times"] and x["times"][0]["minutes"] != "?" else 999)
+                formatted_arrivals.sort(key=lambda x: x["times"][0]["minutes"] if x["times"] and x["times"][0]["minutes"] is not None else 999)
             except Exception as e:
                 _LOGGER.warning("Error sorting arrivals: %s", e)
             
-            _LOGGER.debug("Formatted %d arrival lines", len(formatted_arrivals))
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("Formatted %d arrival lines", len(formatted_arrivals))
             return formatted_arrivals
             
         except MuniDataFormatError:
@@ -290,57 +597,85 @@ class MuniAPI:
             _LOGGER.error(error_msg)
             raise MuniDataFormatError(error_msg) from e
 
-    def _calculate_minutes_until_arrival(self, arrival_time_str: str) -> str:
-        """Calculate minutes until arrival."""
+    def refresh_arrival_times(self, arrivals: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Recompute minutes until arrival for previously formatted arrivals.
+
+        Used for stops that are not re-fetched on an update so their
+        countdown keeps moving without an API request.
+        """
+        now = datetime.now(timezone.utc)
+        refreshed = []
+        for line_data in arrivals:
+            times = []
+            for time_info in line_data.get("times", []):
+                minutes_until = self._calculate_minutes_until_arrival(
+                    time_info.get("arrival_time", ""), now
+                )
+                times.append({
+                    **time_info,
+                    "minutes": minutes_until,
+                    "formatted_time": f"{minutes_until} min" if minutes_until is not None else "?",
+                })
+            refreshed.append({**line_data, "times": times})
+        
+        return refreshed
+
+    def _calculate_minutes_until_arrival(
+        self, arrival_time_str: str, now: datetime | None = None
+    ) -> int | None:
+        """Calculate minutes until arrival, relative to now (defaults to the current time).
+
+        Returns None when the arrival time cannot be parsed.
+        """
         try:
-            arrival_time = datetime.fromisoformat(arrival_time_str.replace('Z', '+00:00'))
-            now = datetime.now(timezone.utc)
+            arrival_time = datetime.fromisoformat(arrival_time_str)
+            if now is None:
+                now = datetime.now(timezone.utc)
             diff = arrival_time - now
-            minutes = max(0, int(diff.total_seconds() / 60))
-            return str(minutes)
+            return max(0, int(diff.total_seconds() / 60))
         except Exception:
-            return "?"
+            return None
 
     def _get_line_icon(self, line_ref: str) -> str:
         """Get appropriate icon for line."""
-        # Check if it's a number-based route
-        if line_ref.isdigit():
-            if line_ref in TROLLEYBUS_ROUTES:
-                return LINE_ICONS["trolleybus"]
-            else:
-                return LINE_ICONS["bus"]
-        
-        # Cable car lines
-        elif line_ref in CABLE_CAR_LINES:
-            return LINE_ICONS["cable_car"]
+        # Known trolleybus, cable car and metro lines, plus lines resolved before
+        icon = _LINE_ICON_CACHE.get(line_ref)
+        if icon is not None:
+            return icon
         
-        # Metro/streetcar lines
-        elif line_ref in METRO_LINES:
-            return LINE_ICONS["metro"]
+        # Remaining number-based routes are regular buses
+        if line_ref.isdigit():
+            icon = LINE_ICONS["bus"]
         
         # Special services
-        elif line_ref == "91" or "OWL" in line_ref:
-            return LINE_ICONS["owl"]
+        elif "OWL" in line_ref:
+            icon = LINE_ICONS["owl"]
         elif "R" in line_ref:
-            return LINE_ICONS["express"]
+            icon = LINE_ICONS["express"]
+        else:
+            icon = ""
         
-        return ""
+        return _LINE_ICON_CACHE.setdefault(line_ref, icon)
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session with connection pooling."""
         if self._session is None:
-            # Create connector with connection pooling
-            connector = aiohttp.TCPConnector(**self._connector_kwargs)
+            # Create connector with connection pooling; resolve DNS with c-ares
+            # instead of the default thread pool when aiodns is available
+            connector_kwargs = dict(self._connector_kwargs)
+            if aiodns is not None and sys.platform != "win32":
+                connector_kwargs["resolver"] = aiohttp.AsyncResolver()
+            connector = aiohttp.TCPConnector(**connector_kwargs)
             
-            # Create session with connector
+            # Create session with connector; Accept-Encoding is left to aiohttp,
+            # which advertises every encoding it can decode (br with Brotli)
             self._session = aiohttp.ClientSession(
                 connector=connector,
                 headers={
                     'User-Agent': 'HomeAssistant-MuniTimes/1.0',
                     'Accept': 'application/json',
-                    'Accept-Encoding': 'gzip, deflate',
                 },
-                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                timeout=self._client_timeout,
                 raise_for_status=False,  # We handle status codes manually
             )
             self._close_session = True
@@ -349,11 +684,11 @@ class MuniAPI:
         
         return self._session
 
-    async def test_connection(self, test_stop_code: str = "13543") -> bool:
+    async def test_connection(self, test_stop_code: str = TEST_STOP_CODE) -> bool:
         """Test the API connection with a known stop code."""
         try:
-            # Try to fetch data for a test stop
-            await self.get_arrivals(test_stop_code)
+            # Try to fetch data for a test stop, bypassing the response cache
+            await self._fetch_arrivals(test_stop_code)
             return True
         except MuniAuthenticationError:
             # Authentication errors mean the connection works but credentials are bad
@@ -365,15 +700,16 @@ class MuniAPI:
     def get_health_status(self) -> dict[str, Any]:
         """Get current health status of the API client."""
         health_info = self.health_monitor.get_health_info()
+        now = time.monotonic()
         
         return {
-            "is_healthy": self.health_monitor.is_healthy,
+            "is_healthy": health_info["is_healthy"],
             "success_rate": health_info["success_rate"],
             "consecutive_failures": health_info["consecutive_failures"],
             "last_success": health_info["last_success"],
             "last_failure": health_info["last_failure"],
-            "current_rate_limit": self.rate_limiter.current_rate,
-            "time_until_rate_reset": self.rate_limiter.time_until_reset,
+            "current_rate_limit": self.rate_limiter.get_current_rate(now),
+            "time_until_rate_reset": self.rate_limiter.get_time_until_reset(now),
         }
 
     def reset_health_monitoring(self) -> None:
@@ -382,7 +718,16 @@ class MuniAPI:
         _LOGGER.info("Health monitoring statistics reset")
 
     async def close(self) -> None:
-        """Close the session and clean up resources."""
+        """Close the session if we created it and clean up resources.
+
+        Injected sessions (such as Home Assistant's shared session) are left
+        open for their owner to manage.
+        """
+        # Stop any background revalidation
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+        
         if self._session and self._close_session:
             await self._session.close()
             _LOGGER.debug("Closed aiohttp session")
@@ -18,14 +18,9 @@ from .const import (
     ATTR_ERROR_COUNT,
     ATTR_LAST_ERROR,
     ATTR_SUCCESS_RATE,
-    CONF_MAX_RESULTS,
-    CONF_SHOW_LINE_ICONS,
-    CONF_TIME_FORMAT,
-    DEFAULT_MAX_RESULTS,
-    DEFAULT_SHOW_LINE_ICONS,
-    DEFAULT_TIME_FORMAT,
     DOMAIN,
 )
+from .models import StopData
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -42,19 +37,18 @@ async def async_setup_entry(
     
     # Create a sensor for each configured stop
     for stop in coordinator.stops:
-        stop_code = stop.get("stop_code")
+        stop_code = stop["stop_code"]
         stop_name = stop.get("stop_name", f"Stop {stop_code}")
         
-        if stop_code:
-            entities.append(
-                MuniTimesStopSensor(
-                    coordinator=coordinator,
-                    stop_code=stop_code,
-                    stop_name=stop_name,
-                    stop_config=stop,
-                    config_entry=config_entry,
-                )
+        entities.append(
+            MuniTimesStopSensor(
+                coordinator=coordinator,
+                stop_code=stop_code,
+                stop_name=stop_name,
+                stop_config=stop,
+                config_entry=config_entry,
             )
+        )
     
     async_add_entities(entities, update_before_add=True)
 
@@ -81,72 +75,134 @@ class MuniTimesStopSensor(CoordinatorEntity, SensorEntity):
         self._attr_name = stop_name
         self._attr_unique_id = f"{DOMAIN}_{stop_code}"
         self._attr_icon = "mdi:bus"
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, stop_code)},
+            "name": stop_name,
+            "manufacturer": "511.org",
+            "model": "Transit Stop",
+            "sw_version": "2.0.0",  # Updated version to reflect enhanced features
+        }
+        
+        # Attributes fixed by the stop's configuration
+        self._static_attributes: dict[str, Any] = {
+            "stop_code": stop_code,
+            "stop_name": stop_name,
+            "agency": config_entry.data.get("agency", "SF"),
+        }
+        if stop_config.get("direction"):
+            self._static_attributes["direction"] = stop_config["direction"]
+        if stop_config.get("line_names"):
+            self._static_attributes["line_name_overrides"] = stop_config["line_names"]
+        
+        # The coordinator's shape is fixed after setup, so resolve optional parts once
+        self._coord_has_failures = hasattr(coordinator, 'consecutive_failures')
+        self._coord_has_health = hasattr(coordinator, 'health_snapshot')
+        self._coord_cache = getattr(coordinator, 'cache', None)
+        self._coord_error_history = getattr(coordinator, 'error_history', None)
         
-        # Configuration options
-        self._max_results = config_entry.data.get(CONF_MAX_RESULTS, DEFAULT_MAX_RESULTS)
-        self._show_line_icons = config_entry.data.get(CONF_SHOW_LINE_ICONS, DEFAULT_SHOW_LINE_ICONS)
-        self._time_format = config_entry.data.get(CONF_TIME_FORMAT, DEFAULT_TIME_FORMAT)
+        # (stop entry, error flag, (state, icon)) from the last state computation
+        self._state_cache: tuple[StopData | None, bool, tuple[str, str]] | None = None
+        
+        # Inputs and result of the last attribute build
+        self._attr_cache_key: tuple | None = None
+        self._attr_cache_value: dict[str, Any] | None = None
 
-    @property
-    def native_value(self) -> str | None:
-        """Return the state of the sensor with cache indicators."""
-        if not self.coordinator.data or self._stop_code not in self.coordinator.data:
+    def _get_stop_data(self) -> StopData | None:
+        """Return this stop's entry from the coordinator data, if any."""
+        data = self.coordinator.data
+        return data.get(self._stop_code) if data else None
+
+    def _classify_state(self) -> tuple[str, str]:
+        """Return the state and icon, recomputed only when the stop's entry or error state changes.
+
+        The coordinator replaces a stop's entry whenever its data changes,
+        so the entry's identity is enough to tell whether the result is stale.
+        """
+        stop_data = self._get_stop_data()
+        has_errors = self._coord_has_failures and self.coordinator.consecutive_failures > 0
+        
+        cached = self._state_cache
+        if cached is not None and cached[0] is stop_data and cached[1] == has_errors:
+            return cached[2]
+        
+        state = self._compute_state(stop_data, has_errors)
+        self._state_cache = (stop_data, has_errors, state)
+        return state
+
+    @staticmethod
+    def _compute_state(stop_data: StopData | None, has_errors: bool) -> tuple[str, str]:
+        """Derive the state with cache indicators and the matching icon."""
+        if stop_data is None:
             # Check if we're in an error state
-            if hasattr(self.coordinator, 'consecutive_failures') and self.coordinator.consecutive_failures > 0:
-                return "Connection error"
-            return "No data"
+            if has_errors:
+                return "Connection error", "mdi:bus-alert"
+            return "No data", "mdi:bus-off"
         
-        stop_data = self.coordinator.data[self._stop_code]
-        arrivals = stop_data.get("arrivals", [])
-        from_cache = stop_data.get("from_cache", False)
+        lines = stop_data.lines
+        from_cache = stop_data.from_cache
         
-        if not arrivals:
-            if from_cache:
-                return "No arrivals (cached)"
-            return "No arrivals"
+        # Change icon based on data source and whether there are arrivals
+        if from_cache:
+            icon = "mdi:bus-clock" if stop_data.arrivals else "mdi:bus-off"
+        else:
+            icon = "mdi:bus" if stop_data.arrivals else "mdi:bus-stop"
         
         # Return the next arrival time for the first line
-        first_line = arrivals[0]
-        if first_line.get("times"):
-            next_arrival = first_line["times"][0]
-            formatted_time = next_arrival.get("formatted_time", "?")
+        if lines and lines[0].get("arrivals"):
+            formatted_time = lines[0]["arrivals"][0]["formatted_time"]
             
             # Add cache indicator if data is from cache
             if from_cache:
-                cache_age = stop_data.get("cache_age_minutes", 0)
+                cache_age = stop_data.cache_age_minutes
                 if cache_age > 0:
-                    return f"{formatted_time} (cached {cache_age:.0f}m ago)"
-                else:
-                    return f"{formatted_time} (cached)"
+                    return f"{formatted_time} (cached {cache_age:.0f}m ago)", icon
+                return f"{formatted_time} (cached)", icon
             
-            return formatted_time
+            return formatted_time, icon
         
         if from_cache:
-            return "No arrivals (cached)"
-        return "No arrivals"
+            return "No arrivals (cached)", icon
+        return "No arrivals", icon
+
+    @property
+    def native_value(self) -> str | None:
+        """Return the state of the sensor with cache indicators."""
+        return self._classify_state()[0]
 
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
-        """Return the state attributes with enhanced error and cache information."""
+        """Return the state attributes with enhanced error and cache information.
+
+        Only built on state writes, which the coordinator (always_update=False)
+        skips when no stop's data changed, and reused while its inputs are unchanged.
+        """
+        stop_data = self._get_stop_data()
+        coordinator = self.coordinator
+        key = (
+            stop_data,
+            coordinator.consecutive_failures if self._coord_has_failures else None,
+            self._coord_error_history[-1] if self._coord_error_history else None,
+            coordinator.health_snapshot if self._coord_has_health else None,
+            coordinator.cache_snapshot if self._coord_cache else None,
+            coordinator.last_successful_update,
+        )
+        if key == self._attr_cache_key:
+            return self._attr_cache_value
+        
         # Base attributes always available
-        attributes = {
-            "stop_code": self._stop_code,
-            "stop_name": self._stop_name,
-            "agency": self._config_entry.data.get("agency", "SF"),
-            "lines": [],
-        }
+        attributes = {**self._static_attributes, "lines": []}
         
         # Add error and health information
-        if hasattr(self.coordinator, 'consecutive_failures'):
+        if self._coord_has_failures:
             attributes[ATTR_ERROR_COUNT] = self.coordinator.consecutive_failures
         
-        if hasattr(self.coordinator, 'error_history') and self.coordinator.error_history:
-            attributes[ATTR_LAST_ERROR] = self.coordinator.error_history[-1]
+        if self._coord_error_history:
+            attributes[ATTR_LAST_ERROR] = self._coord_error_history[-1]
         
-        # Add API health status
-        if hasattr(self.coordinator, 'api') and hasattr(self.coordinator.api, 'get_health_status'):
-            try:
-                health_status = self.coordinator.api.get_health_status()
+        # Add API health status, captured by the coordinator once per update
+        if self._coord_has_health:
+            health_status = self.coordinator.health_snapshot
+            if health_status is not None:
                 attributes[ATTR_API_HEALTH] = {
                     "is_healthy": health_status.get("is_healthy", False),
                     "consecutive_failures": health_status.get("consecutive_failures", 0),
@@ -160,24 +216,20 @@ class MuniTimesStopSensor(CoordinatorEntity, SensorEntity):
                     attributes[ATTR_CONNECTION_STATUS] = "unhealthy"
                 else:
                     attributes[ATTR_CONNECTION_STATUS] = "degraded"
-            except Exception as e:
-                _LOGGER.debug("Failed to get API health status: %s", e)
+            else:
                 attributes[ATTR_CONNECTION_STATUS] = "unknown"
         
-        # Add cache information
-        cache_status = "disabled"
-        if hasattr(self.coordinator, 'cache') and self.coordinator.cache:
-            cache_status = "enabled"
-            try:
-                cache_info = self.coordinator.cache.get_cache_info()
+        # Add cache information, captured by the coordinator once per update
+        if self._coord_cache:
+            cache_info = self.coordinator.cache_snapshot or {}
+            if "error" in cache_info:
+                attributes[ATTR_CACHE_STATUS] = {"enabled": True, "error": cache_info["error"]}
+            else:
                 attributes[ATTR_CACHE_STATUS] = {
                     "enabled": True,
                     "total_entries": cache_info.get("total_entries", 0),
                     "valid_entries": cache_info.get("valid_entries", 0),
                 }
-            except Exception as e:
-                _LOGGER.debug("Failed to get cache info: %s", e)
-                attributes[ATTR_CACHE_STATUS] = {"enabled": True, "error": str(e)}
         else:
             attributes[ATTR_CACHE_STATUS] = {"enabled": False}
         
@@ -186,132 +238,55 @@ class MuniTimesStopSensor(CoordinatorEntity, SensorEntity):
             attributes["last_updated"] = self.coordinator.last_successful_update.isoformat()
         
         # Process stop data if available
-        if self.coordinator.data and self._stop_code in self.coordinator.data:
-            stop_data = self.coordinator.data[self._stop_code]
-            arrivals = stop_data.get("arrivals", [])
-            from_cache = stop_data.get("from_cache", False)
+        if stop_data is not None:
+            from_cache = stop_data.from_cache
             
             # Add cache-specific information
             if from_cache:
                 attributes["data_source"] = "cache"
-                cache_age = stop_data.get("cache_age_minutes", 0)
+                cache_age = stop_data.cache_age_minutes
                 attributes[ATTR_CACHED_DATA_AGE] = cache_age
                 
-                if stop_data.get("cached_at"):
-                    attributes["cached_at"] = stop_data["cached_at"]
+                if stop_data.cached_at:
+                    attributes["cached_at"] = stop_data.cached_at
             else:
                 attributes["data_source"] = "api"
                 attributes[ATTR_CACHED_DATA_AGE] = 0
             
-            # Add arrival information for each line
-            for arrival in arrivals[:self._max_results]:
-                line_info = {
-                    "line": arrival.get("line", ""),
-                    "line_ref": arrival.get("line_ref", ""),
-                    "destinations": arrival.get("destinations", []),
-                    "arrivals": []
-                }
-                
-                # Add up to max_results arrivals for this line
-                for time_info in arrival.get("times", [])[:self._max_results]:
-                    line_info["arrivals"].append({
-                        "minutes": time_info.get("minutes", "?"),
-                        "formatted_time": time_info.get("formatted_time", "?"),
-                        "destination": time_info.get("destination", ""),
-                        "arrival_time": time_info.get("arrival_time", "")
-                    })
-                
-                attributes["lines"].append(line_info)
+            # Line payloads are pre-formatted by the coordinator
+            attributes["lines"] = stop_data.lines
             
             # Update last updated time if we have fresh data
-            if not from_cache and stop_data.get("last_updated"):
-                attributes["last_updated"] = stop_data["last_updated"].isoformat()
+            if not from_cache and stop_data.last_updated:
+                attributes["last_updated"] = stop_data.last_updated.isoformat()
         else:
             # No data available
             attributes["data_source"] = "none"
             attributes[ATTR_CACHED_DATA_AGE] = 0
         
-        # Add configuration info
-        if self._stop_config.get("direction"):
-            attributes["direction"] = self._stop_config["direction"]
-        
-        if self._stop_config.get("line_names"):
-            attributes["line_name_overrides"] = self._stop_config["line_names"]
-        
+        self._attr_cache_key = key
+        self._attr_cache_value = attributes
         return attributes
 
     @property
     def available(self) -> bool:
         """Return True if entity is available, considering both fresh and cached data."""
-        # Entity is available if we have any data (fresh or cached)
-        if self.coordinator.data and self._stop_code in self.coordinator.data:
-            return True
-        
-        # Also consider available if we had recent success, even without current data
-        if self.coordinator.last_update_success:
-            return True
-        
-        # Check if we have cached data available
-        if (hasattr(self.coordinator, 'cache') and 
-            self.coordinator.cache and 
-            hasattr(self.coordinator, '_has_any_cached_data')):
-            try:
-                # This is an async method, so we can't call it directly
-                # But the coordinator should have already checked this
-                pass
-            except Exception:
-                pass
-        
-        # Consider unavailable only if we have no data and significant failures
-        if (hasattr(self.coordinator, 'consecutive_failures') and 
-            self.coordinator.consecutive_failures > 5):
-            return False
-        
-        # Default to available to prevent sensors from going unavailable too quickly
-        return True
+        # Available with any data (fresh or cached) or a recent success; otherwise only
+        # go unavailable after significant failures so sensors don't drop out too quickly
+        return (
+            self.coordinator.last_update_success
+            or not self._coord_has_failures
+            or self.coordinator.consecutive_failures <= 5
+            or self._get_stop_data() is not None
+        )
 
-    @property
-    def device_info(self) -> dict[str, Any]:
-        """Return device information about this sensor."""
-        return {
-            "identifiers": {(DOMAIN, self._stop_code)},
-            "name": self._stop_name,
-            "manufacturer": "511.org",
-            "model": "Transit Stop",
-            "sw_version": "2.0.0",  # Updated version to reflect enhanced features
-        }
-    
     @property
     def icon(self) -> str:
         """Return the icon for the sensor based on connection status."""
-        # Change icon based on data source and connection status
-        if not self.coordinator.data or self._stop_code not in self.coordinator.data:
-            if hasattr(self.coordinator, 'consecutive_failures') and self.coordinator.consecutive_failures > 0:
-                return "mdi:bus-alert"  # Error state
-            return "mdi:bus-off"  # No data
-        
-        stop_data = self.coordinator.data[self._stop_code]
-        from_cache = stop_data.get("from_cache", False)
-        arrivals = stop_data.get("arrivals", [])
-        
-        if from_cache:
-            if arrivals:
-                return "mdi:bus-clock"  # Cached data with arrivals
-            else:
-                return "mdi:bus-off"  # Cached data but no arrivals
-        else:
-            if arrivals:
-                return "mdi:bus"  # Fresh data with arrivals
-            else:
-                return "mdi:bus-stop"  # Fresh data but no arrivals
+        return self._classify_state()[1]
     
     @property
     def entity_picture(self) -> str | None:
         """Return entity picture if needed."""
         # Could be used to show different pictures based on transit type
         return None
-    
-    @property
-    def should_poll(self) -> bool:
-        """Return False as we use coordinator for updates."""
-        return False
\ No newline at end of file
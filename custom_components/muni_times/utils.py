@@ -3,16 +3,26 @@ from __future__ import annotations
 
 import asyncio
 import functools
+import json
 import logging
 import random
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Any, Callable, TypeVar
 
 import aiohttp
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ships with Home Assistant
+    orjson = None
+
 from .exceptions import (
     MuniAPIError,
+    MuniAuthenticationError,
     MuniConnectionError,
+    MuniInvalidStopError,
     MuniRateLimitError,
     MuniTimeoutError,
     classify_connection_error,
@@ -23,6 +33,28 @@ _LOGGER = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+# Deletes every ASCII character that is not alphanumeric, a hyphen or an underscore
+_STOP_CODE_DELETE_TABLE = str.maketrans(
+    "", "", "".join(chr(i) for i in range(128) if not (chr(i).isalnum() or chr(i) in "-_"))
+)
+
+
+def json_loads(data: bytes | str) -> Any:
+    """Decode JSON with orjson when available, falling back to the stdlib.
+
+    Both raise a json.JSONDecodeError (orjson's error subclasses it).
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Encode JSON as UTF-8 bytes with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
 
 def retry_on_failure(
     max_retries: int = 3,
@@ -32,6 +64,11 @@ def retry_on_failure(
     jitter: bool = True,
 ) -> Callable[[Callable[..., T]], Callable[..., T]]:
     """Decorator for retry logic with exponential backoff."""
+    # Backoff delays before jitter are fixed per decorated function
+    delays = tuple(
+        min(base_delay * (exponential_base ** attempt), max_delay)
+        for attempt in range(max_retries)
+    )
     
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
         @functools.wraps(func)
@@ -45,6 +82,9 @@ def retry_on_failure(
                     last_exception = e
                     
                     # Don't retry on authentication errors or invalid stops
+                    if isinstance(e, (MuniAuthenticationError, MuniInvalidStopError)):
+                        raise
+                    
                     if isinstance(e, (aiohttp.ClientResponseError,)):
                         error_class = classify_http_error(e.status)
                         if error_class in (MuniAPIError, MuniConnectionError):
@@ -65,8 +105,8 @@ def retry_on_failure(
                                 raise error_class(str(e)) from e
                         raise
                     
-                    # Calculate delay with exponential backoff
-                    delay = min(base_delay * (exponential_base ** attempt), max_delay)
+                    # Exponential backoff delay for this attempt
+                    delay = delays[attempt]
                     
                     # Add jitter to prevent thundering herd
                     if jitter:
@@ -77,7 +117,7 @@ def retry_on_failure(
                         attempt + 1,
                         max_retries + 1,
                         func.__name__,
-                        str(e),
+                        e,
                         delay,
                     )
                     
@@ -94,31 +134,44 @@ def retry_on_failure(
 class ConnectionHealthMonitor:
     """Monitor connection health and track success/failure rates."""
     
+    __slots__ = (
+        "window_size",
+        "success_history",
+        "_success_count",
+        "last_success_mono",
+        "last_failure_mono",
+        "consecutive_failures",
+    )
+    
     def __init__(self, window_size: int = 10) -> None:
         """Initialize the health monitor."""
         self.window_size = window_size
-        self.success_history: list[bool] = []
-        self.last_success: datetime | None = None
-        self.last_failure: datetime | None = None
+        self.success_history: deque[bool] = deque(maxlen=window_size)
+        self._success_count = 0  # successes currently in the window
+        self.last_success_mono: float | None = None
+        self.last_failure_mono: float | None = None
         self.consecutive_failures = 0
         
     def record_success(self) -> None:
         """Record a successful operation."""
-        self.success_history.append(True)
-        if len(self.success_history) > self.window_size:
-            self.success_history.pop(0)
+        self._record(True)
         
-        self.last_success = datetime.now()
+        self.last_success_mono = time.monotonic()
         self.consecutive_failures = 0
         
     def record_failure(self) -> None:
         """Record a failed operation."""
-        self.success_history.append(False)
-        if len(self.success_history) > self.window_size:
-            self.success_history.pop(0)
+        self._record(False)
         
-        self.last_failure = datetime.now()
+        self.last_failure_mono = time.monotonic()
         self.consecutive_failures += 1
+    
+    def _record(self, success: bool) -> None:
+        """Add a result to the window, keeping the success count in step."""
+        if len(self.success_history) == self.success_history.maxlen:
+            self._success_count -= self.success_history[0]
+        self.success_history.append(success)
+        self._success_count += success
         
     @property
     def success_rate(self) -> float:
@@ -126,7 +179,7 @@ class ConnectionHealthMonitor:
         if not self.success_history:
             return 0.0
         
-        return sum(self.success_history) / len(self.success_history)
+        return self._success_count / len(self.success_history)
     
     @property
     def is_healthy(self) -> bool:
@@ -134,92 +187,121 @@ class ConnectionHealthMonitor:
         # Consider unhealthy if success rate is below 50% or more than 5 consecutive failures
         return self.success_rate >= 0.5 and self.consecutive_failures < 5
     
+    @property
+    def last_success(self) -> datetime | None:
+        """Get the wall-clock time of the last successful operation."""
+        since_success = self.time_since_last_success
+        return datetime.now() - since_success if since_success is not None else None
+    
+    @property
+    def last_failure(self) -> datetime | None:
+        """Get the wall-clock time of the last failed operation."""
+        since_failure = self.time_since_last_failure
+        return datetime.now() - since_failure if since_failure is not None else None
+    
     @property
     def time_since_last_success(self) -> timedelta | None:
         """Get time since last successful operation."""
-        if self.last_success is None:
-            return None
-        return datetime.now() - self.last_success
+        return self.get_time_since_last_success()
     
     @property
     def time_since_last_failure(self) -> timedelta | None:
         """Get time since last failed operation."""
-        if self.last_failure is None:
+        return self.get_time_since_last_failure()
+    
+    def get_time_since_last_success(self, now: float | None = None) -> timedelta | None:
+        """Get time since last successful operation, optionally relative to a monotonic now."""
+        if self.last_success_mono is None:
+            return None
+        return timedelta(seconds=(now or time.monotonic()) - self.last_success_mono)
+    
+    def get_time_since_last_failure(self, now: float | None = None) -> timedelta | None:
+        """Get time since last failed operation, optionally relative to a monotonic now."""
+        if self.last_failure_mono is None:
             return None
-        return datetime.now() - self.last_failure
+        return timedelta(seconds=(now or time.monotonic()) - self.last_failure_mono)
     
     def get_health_info(self) -> dict[str, Any]:
         """Get comprehensive health information."""
+        now = time.monotonic()
+        since_success = self.get_time_since_last_success(now)
+        since_failure = self.get_time_since_last_failure(now)
+        
+        # Wall-clock times are only needed here, for display
+        wall_now = datetime.now()
+        
         return {
             "success_rate": self.success_rate,
             "is_healthy": self.is_healthy,
             "consecutive_failures": self.consecutive_failures,
             "total_operations": len(self.success_history),
-            "last_success": self.last_success.isoformat() if self.last_success else None,
-            "last_failure": self.last_failure.isoformat() if self.last_failure else None,
+            "last_success": (
+                (wall_now - since_success).isoformat() if since_success is not None else None
+            ),
+            "last_failure": (
+                (wall_now - since_failure).isoformat() if since_failure is not None else None
+            ),
             "time_since_last_success_minutes": (
-                self.time_since_last_success.total_seconds() / 60
-                if self.time_since_last_success else None
+                since_success.total_seconds() / 60 if since_success is not None else None
             ),
             "time_since_last_failure_minutes": (
-                self.time_since_last_failure.total_seconds() / 60
-                if self.time_since_last_failure else None
+                since_failure.total_seconds() / 60 if since_failure is not None else None
             ),
         }
 
 
 class RateLimiter:
-    """Simple rate limiter to prevent API abuse."""
+    """Token-bucket rate limiter to prevent API abuse."""
+    
+    __slots__ = ("max_requests", "time_window", "_rate", "_tokens", "_last_refill")
     
     def __init__(self, max_requests: int = 60, time_window: int = 60) -> None:
         """Initialize rate limiter."""
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests: list[datetime] = []
+        self._rate = max_requests / time_window  # tokens refilled per second
+        self._tokens = float(max_requests)
+        self._last_refill = time.monotonic()
+    
+    def _refill(self, now: float) -> float:
+        """Add the tokens earned since the last refill and return the bucket level."""
+        elapsed = max(0.0, now - self._last_refill)
+        self._tokens = min(self.max_requests, self._tokens + elapsed * self._rate)
+        self._last_refill = max(now, self._last_refill)
+        return self._tokens
         
     async def wait_if_needed(self) -> None:
         """Wait if rate limit would be exceeded."""
-        now = datetime.now()
+        # Take a token up front; callers that overdraw the bucket each sleep
+        # until their own token is refilled, so concurrent callers need no lock
+        self._tokens = self._refill(time.monotonic()) - 1
         
-        # Remove old requests outside the time window
-        cutoff = now - timedelta(seconds=self.time_window)
-        self.requests = [req_time for req_time in self.requests if req_time > cutoff]
-        
-        # Check if we need to wait
-        if len(self.requests) >= self.max_requests:
-            # Calculate how long to wait
-            oldest_request = min(self.requests)
-            wait_time = (oldest_request + timedelta(seconds=self.time_window) - now).total_seconds()
-            
-            if wait_time > 0:
-                _LOGGER.warning(
-                    "Rate limit reached. Waiting %.2f seconds before next request",
-                    wait_time
-                )
-                await asyncio.sleep(wait_time)
-                
-        # Record this request
-        self.requests.append(now)
+        if self._tokens < 0:
+            wait_time = -self._tokens / self._rate
+            _LOGGER.warning(
+                "Rate limit reached. Waiting %.2f seconds before next request",
+                wait_time
+            )
+            await asyncio.sleep(wait_time)
     
     @property
     def current_rate(self) -> float:
         """Get current request rate (requests per minute)."""
-        now = datetime.now()
-        cutoff = now - timedelta(seconds=60)  # Last minute
-        recent_requests = [req_time for req_time in self.requests if req_time > cutoff]
-        return len(recent_requests)
+        return self.get_current_rate()
     
     @property
     def time_until_reset(self) -> float:
         """Get time until rate limit resets (in seconds)."""
-        if not self.requests:
-            return 0.0
-            
-        now = datetime.now()
-        oldest_request = min(self.requests)
-        reset_time = oldest_request + timedelta(seconds=self.time_window)
-        
-        return max(0.0, (reset_time - now).total_seconds())
+        return self.get_time_until_reset()
+    
+    def get_current_rate(self, now: float | None = None) -> float:
+        """Get the requests still counted against the limit, optionally relative to a monotonic now."""
+        return self.max_requests - self._refill(now or time.monotonic())
+    
+    def get_time_until_reset(self, now: float | None = None) -> float:
+        """Get time until the bucket is full again (in seconds), optionally relative to a monotonic now."""
+        used = self.max_requests - self._refill(now or time.monotonic())
+        return max(0.0, used / self._rate)
 
 
 def format_timedelta(td: timedelta) -> str:
@@ -248,7 +330,10 @@ def sanitize_stop_code(stop_code: str) -> str:
         raise ValueError("Stop code cannot be empty")
     
     # Remove any non-alphanumeric characters except hyphens and underscores
-    sanitized = "".join(c for c in stop_code if c.isalnum() or c in "-_")
+    if stop_code.isascii():
+        sanitized = stop_code.translate(_STOP_CODE_DELETE_TABLE)
+    else:
+        sanitized = "".join(c for c in stop_code if c.isalnum() or c in "-_")
     
     if not sanitized:
         raise ValueError(f"Invalid stop code: {stop_code}")